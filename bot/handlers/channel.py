@@ -4,10 +4,13 @@ from inspect import getsource
 from telegram import Update
 from telegram.ext import ContextTypes
 from bot.keyboards.menu import kanallar_inline_menu
-from telethon_client.channel_utils import validate_channel, is_user_member
+from telethon_client.channel_utils import (
+    check_channel, check_channels, parse_channel_list, CHANNEL_OK, CHANNEL_INVALID, CHANNEL_NOT_MEMBER
+)
 from telethon_client.user_map import get_phone_by_user
-from telethon_client.channel_store import get_channels, add_channel, remove_channel, toggle_source, toggle_target
+from telethon_client.channel_store import get_channels, add_channel, add_channels, remove_channel, toggle_source, toggle_target
 from telethon_client.session_manager import get_client
+from config import BULK_IMPORT_MAX_CHANNELS, BULK_IMPORT_MAX_FILE_BYTES
 from bot.logger import logger
 from bot.handlers.repost_handler import is_repost_running
 
@@ -45,6 +48,11 @@ async def channel_username_handler(update, context):
         )
         return
 
+    # Ommaviy import rejimi: xabar — kanallar ro‘yxati
+    if user_data and user_data.get("bulk_adding_channels"):
+        await _import_channels(update, context, update.message.text)
+        return
+
     # Kanal qo‘shish rejimida bo‘lmasa — hech narsa qilmaymiz
     if not user_data or not user_data.get("adding_channel"):
         return
@@ -58,35 +66,29 @@ async def channel_username_handler(update, context):
         await update.message.reply_text("❌ Сессия не найдена.")
         return
 
-    # Kanal mavjudligini tekshiramiz
+    # Kanal mavjudligi va a'zolik bitta client da tekshiriladi
     try:
-        is_valid = await validate_channel(phone, username)
+        status, peer_id = await check_channel(phone, username)
     except Exception as e:
-        logger.error(f"User({user_id}) validate_channel error: {e}", exc_info=True)
+        logger.error(f"User({user_id}) check_channel error: {e}", exc_info=True)
         await update.message.reply_text("❌ Ошибка проверки канала!")
         context.user_data["adding_channel"] = False
         return
 
-    if not is_valid:
+    if status == CHANNEL_INVALID:
         logger.info(f"User({user_id}) tried to add invalid/closed channel: {username}")
         await update.message.reply_text("❌ Канал не найден или он закрыт.")
         context.user_data["adding_channel"] = False
         return
 
-    # A'zolikni tekshiramiz
-    try:
-        is_member = await is_user_member(phone, username)
-    except Exception as e:
-        logger.error(f"User({user_id}) is_user_member error: {e}", exc_info=True)
-        is_member = False
-
-    if not is_member:
+    if status == CHANNEL_NOT_MEMBER:
         await update.message.reply_text("❗ Сначала подпишитесь на канал этим аккаунтом!")
         context.user_data["adding_channel"] = False
         return
 
     # ✅ Kanalni ro‘yxatga qo‘shamiz
-    add_channel(user_id, username)
+    await add_channel(user_id, username)
+    logger.info(f"User({user_id}) added channel {username} (peer_id={peer_id})")
     channels = get_channels(user_id)
     keyboard = kanallar_inline_menu(channels)
 
@@ -97,6 +99,80 @@ async def channel_username_handler(update, context):
 
     context.user_data["adding_channel"] = False
 
+_STATUS_TEXT = {
+    CHANNEL_INVALID: "не найден или закрыт",
+    CHANNEL_NOT_MEMBER: "аккаунт не подписан",
+}
+
+async def _import_channels(update, context, text: str):
+    """Ro‘yxatdagi kanallarni parallel tekshiradi, o‘tganlarini bitta yozuv bilan qo‘shadi va yagona hisobot yuboradi."""
+    user_id = update.effective_user.id
+    context.user_data["bulk_adding_channels"] = False
+    phone = get_phone_by_user(user_id)
+    if not phone:
+        logger.warning(f"User({user_id}) session not found for bulk channel import")
+        await update.message.reply_text("❌ Сессия не найдена.")
+        return
+
+    channels = parse_channel_list(text or "")
+    if not channels:
+        await update.message.reply_text("⚠️ Список каналов пуст.")
+        return
+    if len(channels) > BULK_IMPORT_MAX_CHANNELS:
+        await update.message.reply_text(f"⚠️ Слишком много каналов: максимум {BULK_IMPORT_MAX_CHANNELS} за раз.")
+        return
+
+    logger.info(f"User({user_id}) bulk import: {len(channels)} channels, phone: {phone}")
+    await update.message.reply_text(f"⏳ Проверяем {len(channels)} каналов...")
+    try:
+        results = await check_channels(phone, channels)
+    except Exception as e:
+        logger.error(f"User({user_id}) check_channels error: {e}", exc_info=True)
+        await update.message.reply_text("❌ Ошибка проверки каналов!")
+        return
+
+    passed = [channel for channel in channels if results[channel][0] == CHANNEL_OK]
+    failed = [channel for channel in channels if results[channel][0] != CHANNEL_OK]
+    added = await add_channels(user_id, passed) if passed else []
+
+    lines = [f"✅ Добавлено: {len(added)}"]
+    lines += [f"• {channel}" for channel in added]
+    existing = [channel for channel in passed if channel not in added]
+    if existing:
+        lines.append(f"\nℹ️ Уже в списке: {len(existing)}")
+        lines += [f"• {channel}" for channel in existing]
+    if failed:
+        lines.append(f"\n❌ Не добавлено: {len(failed)}")
+        lines += [f"• {channel} — {_STATUS_TEXT[results[channel][0]]}" for channel in failed]
+    logger.info(f"User({user_id}) bulk import done: added={len(added)}, existing={len(existing)}, failed={len(failed)}")
+
+    await update.message.reply_text("\n".join(lines), reply_markup=kanallar_inline_menu(get_channels(user_id)))
+
+async def channel_file_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Ommaviy import rejimida yuborilgan matn fayldan kanallarni import qiladi."""
+    user_data = getattr(context, "user_data", None)
+    if not user_data or not user_data.get("bulk_adding_channels"):
+        return
+    user_id = update.effective_user.id
+    if is_repost_running(user_id):
+        await update.message.reply_text(
+            "♻️ Процесс репоста уже запущен. Вы можете остановить его и затем запустить новый."
+        )
+        return
+
+    document = update.message.document
+    if document.file_size and document.file_size > BULK_IMPORT_MAX_FILE_BYTES:
+        await update.message.reply_text("⚠️ Файл слишком большой. Отправьте текстовый файл со списком каналов.")
+        return
+    try:
+        file = await document.get_file()
+        content = await file.download_as_bytearray()
+    except Exception as e:
+        logger.error(f"User({user_id}) channel list download error: {e}", exc_info=True)
+        await update.message.reply_text("❌ Не удалось загрузить файл!")
+        return
+    await _import_channels(update, context, bytes(content).decode("utf-8", errors="ignore"))
+
 
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -117,6 +193,17 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await query.message.reply_text("🆕 Введите username канала (например: @yourchannel):")
             if hasattr(context, "user_data") and context.user_data is not None:
                 context.user_data["adding_channel"] = True
+                context.user_data["bulk_adding_channels"] = False
+            return
+
+        if data == "bulk_add_channels":
+            await query.message.reply_text(
+                "📥 Отправьте список каналов (каждый с новой строки) или текстовый файл:\n"
+                "@channel1\nhttps://t.me/channel2\nhttps://t.me/+invitehash"
+            )
+            if hasattr(context, "user_data") and context.user_data is not None:
+                context.user_data["bulk_adding_channels"] = True
+                context.user_data["adding_channel"] = False
             return
 
         if data == "ignore":
@@ -126,7 +213,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         if data.startswith("delete:"):
             username = data.split(":", 1)[1]
-            remove_channel(user_id, username)
+            await remove_channel(user_id, username)
             user_data = get_channels(user_id)
             keyboard = kanallar_inline_menu(user_data)
             await query.edit_message_reply_markup(reply_markup=keyboard)
@@ -135,7 +222,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         if data.startswith("source:"):
             username = data.split(":", 1)[1]
-            toggle_source(user_id, username)
+            await toggle_source(user_id, username)
             user_data = get_channels(user_id)
             keyboard = kanallar_inline_menu(user_data)
             await query.edit_message_reply_markup(reply_markup=keyboard)
@@ -144,7 +231,7 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         if data.startswith("target:"):
             username = data.split(":", 1)[1]
-            toggle_target(user_id, username)
+            await toggle_target(user_id, username)
             user_data = get_channels(user_id)
             keyboard = kanallar_inline_menu(user_data)
             await query.edit_message_reply_markup(reply_markup=keyboard)
@@ -166,13 +253,12 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 return
 
             client = await get_client(user_id)
-            async with client:
-                async for message in client.iter_messages(username, limit=5, reverse=True):
-                    for target in targets:
-                        try:
-                            await client.forward_messages(target, message.id, from_peer=username)
-                        except Exception as e:
-                            logger.error(f"User({user_id}) test forward error → {target}: {e}", exc_info=True)
+            async for message in client.iter_messages(username, limit=5, reverse=True):
+                for target in targets:
+                    try:
+                        await client.forward_messages(target, message.id, from_peer=username)
+                    except Exception as e:
+                        logger.error(f"User({user_id}) test forward error → {target}: {e}", exc_info=True)
 
             await query.edit_message_text("✅ Тестовые посты были отправлены в целевые каналы.")
     except Exception as e:
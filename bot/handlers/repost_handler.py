@@ -3,12 +3,15 @@ from telegram.ext import ContextTypes
 from telethon_client.channel_store import get_channels
 from telethon_client.repost_utils_inline import cleanup_inline_posts_and_media
 from bot.logger import logger
-from telethon_client.scheduling import scheduled_repost_by_days  # <-- YANGI IMPORT!
+from telethon_client.scheduling import start_repost_job, cancel_repost_job, is_job_running
 import asyncio
 
+# Faqat test forward tasklari; repost ishlari markaziy dispatcherda (scheduling._jobs)
 user_tasks = {}
 
 def is_repost_running(user_id):
+    if is_job_running(user_id):
+        return True
     task = user_tasks.get(user_id)
     return task is not None and not task.done()
 
@@ -42,12 +45,9 @@ async def start_repost(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await asyncio.sleep(1)  # eski vazifa to'xtashi uchun vaqt berish
 
     try:
-        # YANGI: scheduling.py dan funksiya chaqiramiz!
-        repost_task = context.application.create_task(
-            scheduled_repost_by_days(user_id, source, targets, time, context)
-        )
-        user_tasks[user_id] = repost_task
-        logger.info(f"User({user_id}) repost task started")
+        # Repost ishi markaziy dispatcher taymeriga qo‘shiladi
+        await start_repost_job(user_id, source, targets, time, context.bot)
+        logger.info(f"User({user_id}) repost job scheduled")
     except Exception as e:
         logger.error(f"User({user_id}) failed to start repost: {e}", exc_info=True)
         await update.message.reply_text("❌ Процесс репоста не запущен из-за ошибки!")
@@ -56,7 +56,10 @@ async def stop_repost(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     task = user_tasks.get(user_id)
 
-    if task and not task.done():
+    if await cancel_repost_job(user_id):
+        await update.message.reply_text("⏹️ Репост/тестовая пересылка остановлена.")
+        logger.info(f"User({user_id}) repost job stopped by user.")
+    elif task and not task.done():
         task.cancel()
         await update.message.reply_text("⏹️ Репост/тестовая пересылка остановлена.")
         logger.info(f"User({user_id}) repost/test forward stopped by user.")
@@ -1,9 +1,9 @@
 import asyncio
-import os
 from telegram import Update, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters
 from telethon_client import session_manager
-from telethon_client.user_map import link_user_to_phone, get_phone_by_user
+from telethon_client.user_map import link_user_to_phone, get_phone_by_user, get_users_by_phone
+from telethon_client.scheduling import cancel_repost_job
 from bot.keyboards.menu import main_menu
 from telethon_client.channel_store import remove_user
 
@@ -18,7 +18,7 @@ SESSION_EXPIRE_SECONDS = 120
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     phone = get_phone_by_user(user_id)
-    if phone and session_manager.session_exists(phone):
+    if phone and await session_manager.session_exists(phone):
         await update.message.reply_text(
             "✅ Вы уже зарегистрированы.\nГлавное меню.",
             reply_markup=main_menu()
@@ -49,9 +49,7 @@ async def ask_phone(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Cleanup timer
         async def cleanup():
             await asyncio.sleep(SESSION_EXPIRE_SECONDS)
-            session_file = session_manager.get_session_file_path(phone) + ".session"
-            if os.path.exists(session_file):
-                os.remove(session_file)
+            if await session_manager.delete_session(phone):
                 print(f"[CLEANUP] Session for {phone} deleted after timeout.")
         # Clean pending
         if user_id in user_pending_cleanup:
@@ -83,7 +81,7 @@ async def ask_code(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         await session_manager.complete_login(client, phone, code, phone_code_hash)
-        link_user_to_phone(user_id, phone)
+        await link_user_to_phone(user_id, phone)
         # Clean temp
         user_temp_client.pop(user_id, None)
         user_temp_code_hash.pop(user_id, None)
@@ -103,9 +101,7 @@ async def ask_code(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return ASK_2FA
         # Xatolik bo'lsa
         await update.message.reply_text(f"❌ Ошибка: {str(e)}", reply_markup=ReplyKeyboardRemove())
-        session_file = session_manager.get_session_file_path(phone) + ".session"
-        if os.path.exists(session_file):
-            os.remove(session_file)
+        await session_manager.delete_session(phone)
         # Clean temp
         user_temp_client.pop(user_id, None)
         user_temp_code_hash.pop(user_id, None)
@@ -130,7 +126,7 @@ async def ask_2fa(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         # Faqat password bilan qayta login qilish
         await session_manager.complete_login(client, phone, None, phone_code_hash, password=password)
-        link_user_to_phone(user_id, phone)
+        await link_user_to_phone(user_id, phone)
         # Clean temp
         user_temp_client.pop(user_id, None)
         user_temp_code_hash.pop(user_id, None)
@@ -142,9 +138,7 @@ async def ask_2fa(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     except Exception as e:
         await update.message.reply_text(f"❌ Ошибка 2FA: {str(e)}", reply_markup=ReplyKeyboardRemove())
-        session_file = session_manager.get_session_file_path(phone) + ".session"
-        if os.path.exists(session_file):
-            os.remove(session_file)
+        await session_manager.delete_session(phone)
         # Clean temp
         user_temp_client.pop(user_id, None)
         user_temp_code_hash.pop(user_id, None)
@@ -160,11 +154,14 @@ async def logout_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         del user_pending_cleanup[user_id]
 
     phone = user_temp_phone.get(user_id) or get_phone_by_user(user_id)
+    # Repost ishi avval to‘xtatiladi — aks holda o‘chirilgan sessiya bilan keyinroq xato beradi
+    await cancel_repost_job(user_id)
     if phone:
-        session_file = session_manager.get_session_file_path(phone) + ".session"
-        if os.path.exists(session_file):
-            os.remove(session_file)
-    remove_user(user_id)
+        for linked_user_id in get_users_by_phone(phone):
+            await cancel_repost_job(linked_user_id)
+        await session_manager.logout(phone, user_ids=[user_id])
+    else:
+        await remove_user(user_id)
     await update.message.reply_text(
         "❌ Вы вышли из бота. Все ваши данные удалены.\n\nЧтобы начать заново, нажмите /start",
         reply_markup=ReplyKeyboardRemove()
@@ -2,6 +2,7 @@ from telegram import Update
 from telegram.ext import ContextTypes
 from telethon_client.channel_store import get_channels
 from telethon_client.repost_utils import test_forward_posts
+from telethon_client.account_scheduler import interactive
 from bot.logger import logger
 import asyncio
 from bot.handlers.repost_handler import user_tasks, is_repost_running  # user_tasks lug'atidan foydalanamiz
@@ -31,10 +32,11 @@ async def test_forward(update: Update, context: ContextTypes.DEFAULT_TYPE):
         old_task.cancel()
         await asyncio.sleep(1)
 
-    # TASK yaratib, user_tasks ga yozamiz
-    task = context.application.create_task(
-        test_forward_posts(user_id, source, targets)
-    )
+    # TASK yaratib, user_tasks ga yozamiz (interactive lane — fonda ketayotgan repostlardan oldin o‘tadi)
+    with interactive():
+        task = context.application.create_task(
+            test_forward_posts(user_id, source, targets)
+        )
     user_tasks[user_id] = task  # Bu yerda yozish toʻgʻri amalga oshirilmoqda!
 
     try:
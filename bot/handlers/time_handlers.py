@@ -114,7 +114,7 @@ async def receive_utc_offset(update: Update, context: ContextTypes.DEFAULT_TYPE)
     utc_offset = offset
 
     try:
-        set_time(user_id, start_time, end_time, utc_offset)
+        await set_time(user_id, start_time, end_time, utc_offset)
         logger.info(f"User({user_id}) set time: {start_time} - {end_time}, UTC offset: {utc_offset}")
     except Exception as e:
         logger.error(f"User({user_id}) set_time error: {e}", exc_info=True)
@@ -161,7 +161,7 @@ async def time_callback_handler(update: Update, context: ContextTypes.DEFAULT_TY
     if query.data == "delete_time":
         logger.info(f"User({user_id}) deleted time period")
         try:
-            set_time(user_id, None, None)
+            await set_time(user_id, None, None)
             await query.edit_message_text(
                 "🗑 Время удалено.\n\n🕒 Введите дату начала (ГГГГ-ММ-ДД):"
             )
@@ -37,6 +37,7 @@ def kanallar_inline_menu(user_data: dict):
             logger.error(f"Error generating inline menu for channel {ch}: {e}", exc_info=True)
 
     buttons.append([InlineKeyboardButton(text="➕ Новый канал", callback_data="add_channel")])
+    buttons.append([InlineKeyboardButton(text="📥 Импорт списка", callback_data="bulk_add_channels")])
     return InlineKeyboardMarkup(buttons)
 
 def obuna_tugmalari(username: str, is_member: bool):
@@ -5,11 +5,20 @@ from telegram.ext import (
 from telegram import BotCommand
 from bot.handlers.time_handlers import get_time_conversation_handler, time_callback_handler
 from bot.handlers.session import get_session_conversation_handler, start_command, logout_command
-from bot.handlers.channel import channels_handler, callback_handler, channel_username_handler
+from bot.handlers.channel import channels_handler, callback_handler, channel_username_handler, channel_file_handler
 from bot.handlers.repost_handler import start_repost, stop_repost
 from bot.handlers.test_handler import test_forward
 from bot.keyboards.menu import menu_commands_keyboard  # Agar kerak bo‘lsa
 from config import BOT_TOKEN
+from telethon_client.session_manager import start_client_health_check, start_session_flush, close_all_clients
+from telethon_client.dispatcher import start_dispatcher, stop_dispatcher
+from telethon_client.scheduling import restore_repost_jobs
+from telethon_client.storage import shutdown_storage
+from telethon_client.channel_store import load_channel_store
+from telethon_client.user_map import preload_user_map
+from telethon_client.rate_limiter import load_learned_rates
+from telethon_client.media_cache import start_media_cache_gc, stop_media_cache_gc
+from bot.ptb_post_utils import build_bot_request, init_post_sender
 from bot.logger import logger
 
 # --- YANGI: Bot komandalar menyusini (ko‘k Menu) o‘rnatish funksiyasi ---
@@ -31,13 +40,33 @@ async def show_menu_commands(update, context):
 def main():
     logger.info("Bot application is starting...")
 
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = ApplicationBuilder().token(BOT_TOKEN).request(build_bot_request()).build()
 
     # --- Eng muhim: Bot komandalar menyusini o‘rnatamiz (PTB 20+ uchun) ---
     async def post_init(application):
         await set_bot_commands(application)
+        init_post_sender(application)
+        # Storelar I/O threadlarida oldindan yuklanadi — handlerlar faqat xotiradan o‘qiydi
+        await load_channel_store()
+        await preload_user_map()
+        await load_learned_rates()
+        start_client_health_check()
+        start_session_flush()
+        await start_media_cache_gc()
+        start_dispatcher()
+        # Restartdan oldingi repost ishlarini oxirgi checkpointdan davom ettiramiz
+        restored = await restore_repost_jobs(application.bot)
+        logger.info(f"Restored repost jobs: {restored}")
     app.post_init = post_init
 
+    # Bot to‘xtaganda havzadagi Telethon clientlarni yopamiz
+    async def post_shutdown(application):
+        await stop_dispatcher()
+        stop_media_cache_gc()
+        await close_all_clients()
+        shutdown_storage()
+    app.post_shutdown = post_shutdown
+
     # Agar pastki oq "Menu" ham bo‘lishini istasangiz (kerak bo‘lmasa, bu ikki qatorni o‘chirib yuboring)
     app.add_handler(MessageHandler(filters.TEXT & filters.Regex("^(Menu)$"), show_menu_commands))
 
@@ -56,6 +85,7 @@ def main():
     filters.TEXT & ~filters.COMMAND & filters.ChatType.PRIVATE,
     channel_username_handler
 ))
+    app.add_handler(MessageHandler(filters.Document.ALL & filters.ChatType.PRIVATE, channel_file_handler))
 
     logger.info("All handlers are added. Bot is polling now...")
 
@@ -1,11 +1,42 @@
 import os
-import json
 from telegram import Bot, InlineKeyboardMarkup
 from telegram.request import HTTPXRequest
 from telegram.constants import ParseMode
-from config import BOT_TOKEN, INLINE_JSON_PATH
+from config import BOT_TOKEN, BOT_API_POOL_SIZE, BOT_API_UPLOAD_MAX_BYTES, INLINE_MEDIA_FOLDER
+from telethon_client import inline_store
+from telethon_client.storage import run_io
+from telethon_client.media_downloader import remove_download
 from bot.logger import logger
 
+# PTB Application ga tegishli umumiy Bot (pooled HTTPX ulanishlar bilan)
+_post_bot: Bot | None = None
+
+def build_bot_request() -> HTTPXRequest:
+    """Application va post yuborish uchun umumiy, pooled HTTP client."""
+    return HTTPXRequest(connection_pool_size=BOT_API_POOL_SIZE, connect_timeout=10.0)
+
+def init_post_sender(application):
+    """post_init da chaqiriladi: postlar Application ning Bot obyekti orqali yuboriladi."""
+    global _post_bot
+    _post_bot = application.bot
+    logger.info("PTB post sender bound to application bot")
+
+async def get_post_bot() -> Bot:
+    """Umumiy Bot ni qaytaradi. Application bo‘lmasa (masalan, skriptdan) bitta Bot yaratib qayta ishlatadi."""
+    global _post_bot
+    if _post_bot is None:
+        _post_bot = Bot(token=BOT_TOKEN, request=build_bot_request())
+        await _post_bot.initialize()
+        logger.info("PTB post sender: standalone shared bot initialized")
+    return _post_bot
+
+def _media_timeouts(file_size: int) -> dict:
+    """Fayl hajmiga qarab per-request timeoutlar."""
+    size_in_mb = file_size / (1024 * 1024)
+    write_timeout = min(300, max(10, int(size_in_mb * 2)))  # Yuborish vaqti
+    read_timeout = max(60, write_timeout * 2)               # Javob kutish vaqti
+    return {"read_timeout": read_timeout, "write_timeout": write_timeout}
+
 def parse_reply_markup(reply_markup):
     """
     Har qanday Telethon yoki .to_dict() dan kelgan reply_markupni PTB uchun standartga o'tkazadi.
@@ -44,87 +75,107 @@ def parse_reply_markup(reply_markup):
 
 
 
-async def ptb_send_and_cleanup(post_data, target_channel):
+def extract_file_id(message) -> str | None:
+    """Bot API javobidan yuklangan media file_id sini oladi (keyingi targetlarga qayta yuklamaslik uchun)."""
+    if message is None:
+        return None
+    if message.video_note:
+        return message.video_note.file_id
+    if message.photo:
+        return message.photo[-1].file_id
+    for media in (message.video, message.animation, message.document):
+        if media:
+            return media.file_id
+    return None
+
+async def ptb_send_post(post_data, target_channel, file_id=None, media_file=None):
+    """
+    Inline postni bitta targetga yuboradi va yuborilgan Message ni qaytaradi.
+    media_file — Telethon dan oqim qilib olingan buffer (download_media_stream).
+    file_id berilsa media qayta yuklanmaydi — Telegramdagi fayl havola orqali yuboriladi.
+    """
     text = post_data.get("text") or ""
     reply_markup = post_data.get("reply_markup")
-    media_path = post_data.get("media_path")
+    media_name = post_data.get("media_name")
     is_round_video = post_data.get("is_round_video", False)  # ✅ Dumaloq video flag
-    keyboard = parse_reply_markup(reply_markup)
-
-    try:
-        if media_path and os.path.exists(media_path):
-            # 📏 Dinamik timeoutlarni alohida hisoblaymiz
-            file_size = os.path.getsize(media_path)
-            size_in_mb = file_size / (1024 * 1024)
-            write_timeout = min(300, max(10, int(size_in_mb * 2)))  # Yuborish vaqti
-            read_timeout = max(60, write_timeout * 2)               # Javob kutish vaqti
+    # Bitta post bir nechta targetga yuboriladi — keyboard bir marta parse qilinib post_data da saqlanadi
+    if "ptb_keyboard" not in post_data:
+        post_data["ptb_keyboard"] = parse_reply_markup(reply_markup)
+    keyboard = post_data["ptb_keyboard"]
+    bot = await get_post_bot()
 
-            request = HTTPXRequest(
-                connect_timeout=10.0,
-                read_timeout=read_timeout,
-                write_timeout=write_timeout
+    if media_name and (file_id or media_file):
+        if file_id:
+            file = file_id
+            upload_kwargs = {}
+        else:
+            # Bot API limitidan katta faylni xotiraga o‘qimaymiz — baribir rad etiladi
+            media_file.seek(0, 2)
+            if media_file.tell() > BOT_API_UPLOAD_MAX_BYTES:
+                raise ValueError(f"media {media_name} exceeds Bot API upload limit ({media_file.tell()} bytes)")
+            # Buffer diskka o‘tgan bo‘lishi mumkin — o‘qish thread poolda; 📏 timeoutlar har bir so‘rov uchun alohida
+            media_file.seek(0)
+            file = await run_io(media_file.read)
+            upload_kwargs = _media_timeouts(len(file))
+            upload_kwargs["filename"] = media_name
+        if is_round_video:
+            return await bot.send_video_note(
+                chat_id=target_channel,
+                video_note=file,
+                reply_markup=keyboard,
+                **upload_kwargs
+            )
+        elif media_name.endswith((".jpg", ".jpeg", ".png")):
+            return await bot.send_photo(
+                chat_id=target_channel,
+                photo=file,
+                caption=text,
+                reply_markup=keyboard,
+                parse_mode=ParseMode.HTML,
+                **upload_kwargs
+            )
+        elif media_name.endswith(".mp4"):
+            return await bot.send_video(
+                chat_id=target_channel,
+                video=file,
+                caption=text,
+                reply_markup=keyboard,
+                parse_mode=ParseMode.HTML,
+                supports_streaming=True,  # ✅ original formatni saqlashga yordam beradi
+                **upload_kwargs
             )
-            bot = Bot(token=BOT_TOKEN, request=request)
-
-
-            with open(media_path, "rb") as file:
-                if is_round_video:
-                    await bot.send_video_note(
-                        chat_id=target_channel,
-                        video_note=file,
-                        reply_markup=keyboard
-                    )
-                elif media_path.endswith((".jpg", ".jpeg", ".png")):
-                    await bot.send_photo(
-                        chat_id=target_channel,
-                        photo=file,
-                        caption=text,
-                        reply_markup=keyboard,
-                        parse_mode=ParseMode.HTML
-                    )
-                elif media_path.endswith(".mp4"):
-                    await bot.send_video(
-                        chat_id=target_channel,
-                        video=file,
-                        caption=text,
-                        reply_markup=keyboard,
-                        parse_mode=ParseMode.HTML,
-                        supports_streaming=True  # ✅ original formatni saqlashga yordam beradi
-                    )
-                else:
-                    await bot.send_document(
-                        chat_id=target_channel,
-                        document=file,
-                        caption=text,
-                        reply_markup=keyboard,
-                        parse_mode=ParseMode.HTML
-                    )
-            logger.info(f"Media sent and file will be removed: {media_path}")
-            os.remove(media_path)
-
         else:
-            bot = Bot(token=BOT_TOKEN)  # text-only uchun default bot
-            if text.strip():
-                await bot.send_message(
-                    chat_id=target_channel,
-                    text=text,
-                    reply_markup=keyboard,
-                    parse_mode=ParseMode.HTML
-                )
-                logger.info(f"Text sent to {target_channel}")
-            else:
-                logger.warning(f"Text bo‘sh: post {post_data.get('id')} yuborilmadi")
+            return await bot.send_document(
+                chat_id=target_channel,
+                document=file,
+                caption=text,
+                reply_markup=keyboard,
+                parse_mode=ParseMode.HTML,
+                **upload_kwargs
+            )
 
-        # JSONdan postni o‘chiramiz
-        if os.path.exists(INLINE_JSON_PATH):
-            with open(INLINE_JSON_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            target_id = str(post_data["id"])
-            data = [x for x in data if str(x.get("id")) != target_id]
-            with open(INLINE_JSON_PATH, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            logger.info(f"Post {target_id} removed from {INLINE_JSON_PATH}")
+    if text.strip():
+        sent = await bot.send_message(
+            chat_id=target_channel,
+            text=text,
+            reply_markup=keyboard,
+            parse_mode=ParseMode.HTML
+        )
+        logger.info(f"Text sent to {target_channel}")
+        return sent
+    logger.warning(f"Text bo‘sh: post {post_data.get('id')} yuborilmadi")
+    return None
 
-    except Exception as e:
-        logger.error(f"ptb_send_and_cleanup error (target={target_channel}): {e}", exc_info=True)
+async def cleanup_inline_post(post_data):
+    """
+    Post tugagach (barcha targetlar yoki butunlay tashlab yuborilganda): store yozuvini va yuklangan
+    media faylni (.part qoldiqlari bilan) o‘chiradi. Qayta navbatga qo‘yilgan post uchun chaqirilmaydi.
+    """
+    media_path = post_data.get("media_path")
+    if not media_path and post_data.get("media_name"):
+        # Store dan olingan post_data da yo‘l saqlanmaydi — yuklash shu yo‘lga qilinadi
+        media_path = os.path.join(INLINE_MEDIA_FOLDER, post_data["media_name"])
+    if await run_io(remove_download, media_path):
+        logger.info(f"Media file removed: {media_path}")
 
+    await inline_store.delete_post(post_data["user_id"], post_data["id"])
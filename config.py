@@ -10,3 +10,76 @@ INLINE_MEDIA_FOLDER = os.path.join(SESSION_FOLDER, "inline_media")
 API_ID = "your api id"  # <-- Telegram API ID (https://my.telegram.org)
 API_HASH = "your api hash"  # <-- Telegram API Hash
 BOT_TOKEN = "your bot token"  # <-- Bot token from @BotFather
+
+# Telethon client pool (session_manager)
+CLIENT_IDLE_TIMEOUT = 600  # sekund: shuncha ishlatilmagan client uziladi (keyin lazy qayta ulanadi)
+CLIENT_HEALTH_CHECK_INTERVAL = 60  # sekund: fon health-check oralig‘i
+SESSION_FLUSH_INTERVAL = 60  # sekund: xotiradagi Telethon sessiyalari shu oraliqda .session fayllarga yoziladi
+
+# Scheduler look-ahead: keyingi arxiv kuni inline media larini oldindan keshga (media_cache) yuklash byudjeti
+PREFETCH_MAX_BYTES = 200 * 1024 * 1024
+
+# Inline post media si shu hajmgacha to‘liq xotirada saqlanadi, kattasi vaqtinchalik faylga o‘tadi
+INLINE_MEMORY_MAX_BYTES = 20 * 1024 * 1024
+
+# Katta media parallel qismlab yuklanadi: qism hajmi (512 KB ga karrali) va akkaunt bo‘yicha parallel qismlar
+DOWNLOAD_PART_SIZE = 1024 * 1024
+DOWNLOAD_CONCURRENCY_PER_ACCOUNT = 4
+
+# Kontent-manzilli (sha256) media kesh: takroriy inline postlar diskdan beriladi
+MEDIA_CACHE_FOLDER = os.path.join(SESSION_FOLDER, "media_cache")
+MEDIA_CACHE_QUOTA_BYTES = 2 * 1024 * 1024 * 1024  # oshsa — ishlatilmayotgan eng eski fayllar o‘chiriladi (LRU)
+MEDIA_CACHE_GC_INTERVAL = 600  # sekund: fon GC (yetim fayllar + quota)
+
+# Akkaunt bo‘yicha link/username -> peer (id + access_hash) keshi: shuncha vaqtdan keyin qayta resolve qilinadi
+ENTITY_CACHE_TTL = 7 * 24 * 3600
+
+# Markaziy repost dispatcher: ishchi (worker) coroutinelar soni
+REPOST_WORKERS = 8
+# Ish sozlash/rejalashda vaqtinchalik xato (tarmoq, timeout): ish o‘chirilmaydi, eksponensial kutib qayta uriniladi
+JOB_RETRY_BASE_DELAY = 30  # sekund
+JOB_RETRY_MAX_DELAY = 30 * 60
+
+# Bitta postni targetlarga parallel yuborish limiti
+FANOUT_CONCURRENCY = 5
+
+# Kanallarni ommaviy import qilish: bitta ro‘yxatdagi maksimal kanal soni va akkaunt bo‘yicha parallel tekshiruvlar
+BULK_IMPORT_MAX_CHANNELS = 100
+BULK_IMPORT_MAX_FILE_BYTES = 64 * 1024
+CHANNEL_CHECK_CONCURRENCY = 4
+
+# Telethon rate limiter (token bucket): sekundiga so‘rovlar va burst
+ACCOUNT_SEND_RATE = 1.0  # bitta akkauntdan forward/send (boshlang‘ich, keyin adaptiv o‘zgaradi)
+ACCOUNT_SEND_BURST = 3
+ACCOUNT_READ_RATE = 3.0  # get_messages / download
+ACCOUNT_READ_BURST = 5
+ACCOUNT_DOWNLOAD_RATE = 20.0  # upload.getFile (512 KB) so‘rovlari — har biri alohida scheduler slotida
+ACCOUNT_DOWNLOAD_BURST = 8
+TARGET_SEND_RATE = 20 / 60  # bitta kanalga (Telegram ~20 post/min)
+TARGET_SEND_BURST = 3
+FLOOD_WAIT_RETRIES = 3
+
+# Akkaunt scheduleri: bitta ulanish orqali bir vaqtda bajariladigan so‘rovlar (interactive lane navbatda oldinda)
+ACCOUNT_MAX_INFLIGHT = 6
+FLOOD_WAIT_INLINE_MAX = 30  # sekund: bundan uzun pauzada chaqiriq kutmaydi, ish qayta navbatga qo‘yiladi
+
+# Adaptiv pacing (AIMD): akkaunt send tezligi FloodWaitgacha oshiriladi, FloodWaitda kamaytiriladi
+ADAPTIVE_RATE_FILE = os.path.join(SESSION_FOLDER, "send_rates.json")
+ADAPTIVE_MIN_RATE = 0.1
+ADAPTIVE_MAX_RATE = 5.0
+ADAPTIVE_INCREASE_STEP = 0.1  # har ADAPTIVE_INCREASE_EVERY muvaffaqiyatli yuborishda qo‘shiladi
+ADAPTIVE_INCREASE_EVERY = 20
+ADAPTIVE_DECREASE_FACTOR = 0.5
+
+# Inline postlarni avval Telethon orqali media havola bilan nusxalash (yuklab olish/yuklashsiz)
+INLINE_COPY_MODE = True
+# Akkaunt keyboard yubora oladimi — "Saved Messages" da bir marta tekshiriladi va shu faylda saqlanadi
+COPY_CAPABILITY_FILE = os.path.join(SESSION_FOLDER, "copy_capability.json")
+
+# Bot API: umumiy (pooled) HTTP ulanishlar soni
+BOT_API_POOL_SIZE = 64
+# Bot API orqali yuklash mumkin bo‘lgan maksimal fayl hajmi (kattasi yuklab olinmaydi ham)
+BOT_API_UPLOAD_MAX_BYTES = 50 * 1024 * 1024
+
+# Bloklovchi fayl I/O uchun thread pool hajmi (storage.run_io)
+IO_WORKERS = 8
@@ -0,0 +1,99 @@
+# telethon_client/account_scheduler.py
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+from contextlib import contextmanager
+from config import ACCOUNT_MAX_INFLIGHT
+
+# Navbat (lane) lar: kichik qiymat — yuqori ustuvorlik
+PRIORITY_INTERACTIVE = 0  # bot tugmalari / foydalanuvchi kutayotgan amallar
+PRIORITY_BACKGROUND = 1   # repost, backfill, yuklab olish
+
+# Joriy coroutine (va undan yaratilgan tasklar) qaysi lane da ekanligi
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("account_priority", default=PRIORITY_BACKGROUND)
+
+# phone -> {"inflight": int, "exclusive": bool, "waiters": heap[(priority, seq, exclusive, future)]}
+# Bo‘sh (inflight=0, navbat yo‘q) yozuvlar darhol o‘chiriladi — lug‘at faqat band akkauntlar bilan o‘sadi
+_accounts: dict[str, dict] = {}
+_seq = itertools.count()
+
+def current_priority() -> int:
+    return _priority.get()
+
+@contextmanager
+def interactive():
+    """`with interactive():` ichidagi barcha Telethon so‘rovlari yuqori ustuvor lane da ketadi."""
+    token = _priority.set(PRIORITY_INTERACTIVE)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def _can_run(entry: dict, exclusive: bool) -> bool:
+    if entry["exclusive"]:
+        return False
+    if exclusive:
+        return entry["inflight"] == 0
+    return entry["inflight"] < ACCOUNT_MAX_INFLIGHT
+
+def _grant(entry: dict, exclusive: bool):
+    entry["inflight"] += 1
+    entry["exclusive"] = exclusive
+
+def _wake(phone: str):
+    entry = _accounts.get(phone)
+    if entry is None:
+        return
+    waiters = entry["waiters"]
+    while waiters:
+        _priority_value, _n, exclusive, future = waiters[0]
+        if future.done():  # bekor qilingan kutuvchi
+            heapq.heappop(waiters)
+            continue
+        if not _can_run(entry, exclusive):
+            break  # navbat tartibi qat’iy: oldingisi o‘tmaguncha keyingisi ham kutadi
+        heapq.heappop(waiters)
+        _grant(entry, exclusive)
+        future.set_result(None)
+    if entry["inflight"] == 0 and not waiters:
+        del _accounts[phone]
+
+def _release(phone: str):
+    entry = _accounts[phone]
+    entry["inflight"] -= 1
+    entry["exclusive"] = False
+    _wake(phone)
+
+async def _acquire(phone: str, priority: int, exclusive: bool):
+    entry = _accounts.setdefault(phone, {"inflight": 0, "exclusive": False, "waiters": []})
+    waiters = entry["waiters"]
+    # Navbatda o‘zidan ustuvorroq (yoki teng) kutuvchi bo‘lsa, uni chetlab o‘tmaydi
+    if _can_run(entry, exclusive) and not any(w[0] <= priority and not w[3].done() for w in waiters):
+        _grant(entry, exclusive)
+        return
+    future = asyncio.get_running_loop().create_future()
+    heapq.heappush(waiters, (priority, next(_seq), exclusive, future))
+    try:
+        await future
+    except asyncio.CancelledError:
+        if future.done() and not future.cancelled():
+            _release(phone)  # slot berilgan, lekin task bekor qilingan — qaytaramiz
+        else:
+            _wake(phone)
+        raise
+
+async def run_on_account(phone: str, fn, *args, exclusive: bool = False, priority: int | None = None, **kwargs):
+    """
+    fn() ni akkauntning umumiy ulanishida bajaradi. Bir vaqtda ACCOUNT_MAX_INFLIGHT tagacha so‘rov
+    multiplex qilinadi; navbatda interactive lane background dan oldin o‘tadi.
+    exclusive=True (login/logout) — boshqa so‘rovlar tugashini kutadi va o‘zi yolg‘iz bajariladi.
+    """
+    if priority is None:
+        priority = current_priority()
+    await _acquire(phone, priority, exclusive)
+    try:
+        return await fn(*args, **kwargs)
+    finally:
+        _release(phone)
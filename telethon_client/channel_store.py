@@ -1,48 +1,90 @@
 # telethon_client/channel_store.py
 
+import copy
 import json
 import os
 from config import SESSION_FOLDER
+from telethon_client.storage import open_db, transaction, run_db
 from bot.logger import logger
 
-CHANNEL_FILE = os.path.join(SESSION_FOLDER, "channels.json")
+CHANNEL_FILE = os.path.join(SESSION_FOLDER, "channels.json")  # eski format, faqat migratsiya uchun
+CHANNEL_DB_FILE = "channels.sqlite3"
 
-def _load_data():
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+# Barcha userlar ma'lumoti xotirada; o‘zgarishlar faqat o‘sha user qatori bo‘yicha bazaga yoziladi
+_cache: dict | None = None
+
+def _db():
+    return open_db(CHANNEL_DB_FILE, _SCHEMA)
+
+def _import_legacy_json(conn):
+    """channels.json dan bir martalik migratsiya (keyin fayl .migrated deb qayta nomlanadi)."""
     if not os.path.exists(CHANNEL_FILE):
-        logger.warning(f"CHANNEL_FILE yo'q: {CHANNEL_FILE}")
-        return {}
+        return
     try:
         with open(CHANNEL_FILE, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError as e:
-        logger.error(f"CHANNEL_FILE JSONDecodeError: {e}", exc_info=True)
-        return {}
+            legacy = json.load(f)
+        with transaction(conn):
+            conn.executemany(
+                "INSERT OR REPLACE INTO channels (user_id, data) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in legacy.items()]
+            )
+        os.replace(CHANNEL_FILE, CHANNEL_FILE + ".migrated")
+        logger.info(f"CHANNEL_FILE migrated to SQLite: {len(legacy)} users")
     except Exception as e:
-        logger.error(f"CHANNEL_FILE open/read error: {e}", exc_info=True)
-        return {}
+        logger.error(f"CHANNEL_FILE migration error: {e}", exc_info=True)
+
+def _load_data() -> dict:
+    global _cache
+    if _cache is None:
+        conn = _db()
+        if conn.execute("SELECT COUNT(*) FROM channels").fetchone()[0] == 0:
+            _import_legacy_json(conn)
+        _cache = {row["user_id"]: json.loads(row["data"]) for row in conn.execute("SELECT user_id, data FROM channels")}
+        logger.info(f"Channel store loaded: {len(_cache)} users")
+    return _cache
+
+async def load_channel_store():
+    """Startupda keshni DB threadida yuklaydi — keyingi o‘qishlar event loopni bloklamaydi."""
+    await run_db(_load_data)
+
+def _write_user_row(str_id: str, payload: str | None):
+    if payload is not None:
+        _db().execute(
+            "INSERT OR REPLACE INTO channels (user_id, data) VALUES (?, ?)",
+            (str_id, payload)
+        )
+    else:
+        _db().execute("DELETE FROM channels WHERE user_id = ?", (str_id,))
 
-def _save_data(data):
+async def _save_user(str_id: str):
+    """Faqat bitta userning qatorini atomar yozadi (write-through, DB threadida)."""
+    data = _load_data()
+    payload = json.dumps(data[str_id]) if str_id in data else None
     try:
-        with open(CHANNEL_FILE, "w") as f:
-            json.dump(data, f, indent=2)
-        logger.info(f"CHANNEL_FILE saved: {CHANNEL_FILE}")
+        await run_db(_write_user_row, str_id, payload)
+        logger.info(f"Channel store saved for user {str_id}")
     except Exception as e:
-        logger.error(f"CHANNEL_FILE save error: {e}", exc_info=True)
+        logger.error(f"Channel store save error: {e}", exc_info=True)
 
 def get_channels(user_id: int) -> dict:
-    if not os.path.exists(CHANNEL_FILE):
-        logger.warning(f"channels.json not found for user {user_id}, returning empty")
-        return {"channels": [], "source": None, "targets": []}
     try:
-        with open(CHANNEL_FILE, "r") as f:
-            data = json.load(f)
-        return data.get(str(user_id), {"channels": [], "source": None, "targets": []})
+        data = _load_data().get(str(user_id))
+        if data is None:
+            return {"channels": [], "source": None, "targets": []}
+        return copy.deepcopy(data)
     except Exception as e:
         logger.error(f"get_channels error for user {user_id}: {e}", exc_info=True)
         return {"channels": [], "source": None, "targets": []}
 
 
-def add_channel(user_id: int, username: str):
+async def add_channel(user_id: int, username: str):
     data = _load_data()
     str_id = str(user_id)
     if str_id not in data or not isinstance(data[str_id], dict):
@@ -54,17 +96,34 @@ def add_channel(user_id: int, username: str):
     if username not in data[str_id]["channels"]:
         data[str_id]["channels"].append(username)
         logger.info(f"User({user_id}) channel added: {username}")
-    _save_data(data)
+    await _save_user(str_id)
 
-def remove_user(user_id: int):
+async def add_channels(user_id: int, usernames: list[str]) -> list[str]:
+    """Bir nechta kanalni qo‘shadi — bitta yozuv bilan. Yangi qo‘shilganlarini qaytaradi."""
+    data = _load_data()
+    str_id = str(user_id)
+    if str_id not in data or not isinstance(data[str_id], dict):
+        data[str_id] = {
+            "channels": [],
+            "source": None,
+            "targets": []
+        }
+    added = [username for username in dict.fromkeys(usernames) if username not in data[str_id]["channels"]]
+    if added:
+        data[str_id]["channels"].extend(added)
+        logger.info(f"User({user_id}) channels added: {added}")
+        await _save_user(str_id)
+    return added
+
+async def remove_user(user_id: int):
     data = _load_data()
     key = str(user_id)
     if key in data:
         del data[key]
-        logger.info(f"User({user_id}) removed from channels.json")
-    _save_data(data)
+        logger.info(f"User({user_id}) removed from channel store")
+    await _save_user(key)
 
-def remove_channel(user_id: int, username: str):
+async def remove_channel(user_id: int, username: str):
     data = _load_data()
     str_id = str(user_id)
     if str_id not in data:
@@ -86,9 +145,9 @@ def remove_channel(user_id: int, username: str):
         changed = True
 
     if changed:
-        _save_data(data)
+        await _save_user(str_id)
 
-def toggle_source(user_id: int, username: str):
+async def toggle_source(user_id: int, username: str):
     data = _load_data()
     str_id = str(user_id)
 
@@ -103,9 +162,9 @@ def toggle_source(user_id: int, username: str):
         data[str_id]["source"] = username
         logger.info(f"User({user_id}) set source channel: {username}")
 
-    _save_data(data)
+    await _save_user(str_id)
 
-def toggle_target(user_id: int, username: str):
+async def toggle_target(user_id: int, username: str):
     data = _load_data()
     str_id = str(user_id)
 
@@ -123,9 +182,9 @@ def toggle_target(user_id: int, username: str):
         logger.info(f"User({user_id}) added target: {username}")
 
     data[str_id]["targets"] = targets
-    _save_data(data)
+    await _save_user(str_id)
 
-def set_time(user_id: int, start: str, end: str, utc_offset: int = None):
+async def set_time(user_id: int, start: str, end: str, utc_offset: int = None):
     data = _load_data()
     str_id = str(user_id)
 
@@ -135,5 +194,5 @@ def set_time(user_id: int, start: str, end: str, utc_offset: int = None):
     # UTC offsetni ham saqlaymiz
     data[str_id]["time"] = {"start": start, "end": end, "utc_offset": utc_offset}
     logger.info(f"User({user_id}) set time: {start} - {end}, utc_offset: {utc_offset}")
-    _save_data(data)
+    await _save_user(str_id)
 
@@ -1,8 +1,12 @@
-from telethon import TelegramClient
+import asyncio
 from telethon.errors.rpcerrorlist import UserNotParticipantError, ChannelPrivateError, UsernameNotOccupiedError
+from telethon import utils
 from telethon.tl.functions.channels import GetParticipantRequest, GetFullChannelRequest
-from config import API_ID, API_HASH
-from telethon_client.session_manager import get_session_file_path, with_session_lock
+from telethon_client.session_manager import acquire_client
+from telethon_client.account_scheduler import interactive
+from telethon_client import entity_cache
+from telethon_client.rate_limiter import limited_call
+from config import CHANNEL_CHECK_CONCURRENCY
 from bot.logger import logger
 
 def parse_channel_input(channel):
@@ -18,43 +22,82 @@ def parse_channel_input(channel):
             return "@" + parts[-1]
     return channel
 
-async def validate_channel(phone: str, channel: str) -> bool:
+# check_channel natijalari
+CHANNEL_OK = "ok"
+CHANNEL_INVALID = "invalid"  # topilmadi yoki yopiq
+CHANNEL_NOT_MEMBER = "not_member"
+
+# Akkauntning o‘z InputPeer i (har tekshiruvda get_me qilinmaydi): phone -> InputPeerUser
+_own_peers: dict = {}
+
+async def _own_peer(phone: str, client):
+    if phone not in _own_peers:
+        _own_peers[phone] = await limited_call(phone, lambda: client.get_me(input_peer=True), kind="read")
+    return _own_peers[phone]
+
+async def _check_on_client(phone: str, client, channel: str) -> tuple[str, int | None]:
+    """Tekshiruvning o‘zi: so‘rovlar limited_call (akkaunt scheduleri) orqali."""
+    try:
+        entity = await entity_cache.resolve(client, channel)
+        await limited_call(phone, lambda: client(GetFullChannelRequest(entity)), kind="read")
+    except UsernameNotOccupiedError:
+        logger.warning(f"check_channel: {channel} not found for phone={phone}")
+        return CHANNEL_INVALID, None
+    except ChannelPrivateError:
+        logger.warning(f"check_channel: {channel} is private or not joined for phone={phone}")
+        return CHANNEL_INVALID, None
+    except Exception as e:
+        logger.error(f"check_channel error: {e}", exc_info=True)
+        return CHANNEL_INVALID, None
+
+    peer_id = utils.get_peer_id(entity)
+    try:
+        own_peer = await _own_peer(phone, client)
+        await limited_call(phone, lambda: client(GetParticipantRequest(
+            channel=entity,
+            participant=own_peer
+        )), kind="read")
+    except UserNotParticipantError:
+        logger.info(f"{phone} is NOT member of {channel}")
+        return CHANNEL_NOT_MEMBER, peer_id
+    except Exception as e:
+        logger.error(f"check_channel membership error (phone={phone}, channel={channel}): {e}", exc_info=True)
+        return CHANNEL_NOT_MEMBER, peer_id
+    logger.info(f"check_channel: {channel} ({peer_id}) valid, {phone} is member")
+    return CHANNEL_OK, peer_id
+
+async def check_channel(phone: str, channel: str) -> tuple[str, int | None]:
+    """
+    Kanalni bitta pooled client da tekshiradi: resolve (entity_cache) + full channel + a'zolik.
+    (status, peer_id) qaytaradi; peer_id — belgilangan (-100...) id, entity_cache da ham saqlanadi.
+    """
     channel = parse_channel_input(channel)
-    async def check():
-        async with TelegramClient(get_session_file_path(phone), API_ID, API_HASH) as client:
-            try:
-                entity = await client.get_entity(channel)
-                await client(GetFullChannelRequest(entity))
-                logger.info(f"validate_channel: {channel} valid for phone={phone}")
-                return True
-            except UsernameNotOccupiedError:
-                logger.warning(f"validate_channel: {channel} not found for phone={phone}")
-                return False
-            except ChannelPrivateError:
-                logger.warning(f"validate_channel: {channel} is private or not joined for phone={phone}")
-                return False
-            except Exception as e:
-                logger.error(f"validate_channel error: {e}", exc_info=True)
-                return False
-    return await with_session_lock(phone, check)
-
-async def is_user_member(phone: str, username: str) -> bool:
-    username = parse_channel_input(username)
-    async def check_member():
-        async with TelegramClient(get_session_file_path(phone), API_ID, API_HASH) as client:
-            try:
-                await client.start()
-                me = await client.get_me()
-                await client(GetParticipantRequest(
-                    channel=username,
-                    participant=me.id
-                ))
-                logger.info(f"{phone} is member of {username}")
-                return True
-            except UserNotParticipantError:
-                logger.info(f"{phone} is NOT member of {username}")
-                return False
-            except Exception as e:
-                logger.error(f"is_user_member error (phone={phone}, username={username}): {e}", exc_info=True)
-                return False
-    return await with_session_lock(phone, check_member)
+    # Foydalanuvchi javob kutmoqda — so‘rovlar repost/backfill navbatidan oldin o‘tadi
+    with interactive():
+        client = await acquire_client(phone)
+        return await _check_on_client(phone, client, channel)
+
+def parse_channel_list(text: str) -> list[str]:
+    """Yopishtirilgan ro‘yxat/fayl matnidan kanallarni ajratadi (qator, probel yoki vergul bilan; takrorlarsiz)."""
+    channels = []
+    for item in text.replace(",", " ").split():
+        item = item.strip()
+        if item and item not in channels:
+            channels.append(item)
+    return channels
+
+async def check_channels(phone: str, channels: list[str]) -> dict[str, tuple[str, int | None]]:
+    """
+    Ko‘p kanalni bitta client da parallel tekshiradi (CHANNEL_CHECK_CONCURRENCY tagacha,
+    so‘rovlar akkaunt rate limiteri orqali). Natija: {kanal: (status, peer_id)}.
+    """
+    semaphore = asyncio.Semaphore(CHANNEL_CHECK_CONCURRENCY)
+
+    async def check_one(client, channel):
+        async with semaphore:
+            return channel, await _check_on_client(phone, client, parse_channel_input(channel))
+
+    with interactive():
+        client = await acquire_client(phone)
+        await _own_peer(phone, client)
+        return dict(await asyncio.gather(*(check_one(client, channel) for channel in channels)))
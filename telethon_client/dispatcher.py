@@ -0,0 +1,110 @@
+# telethon_client/dispatcher.py
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from config import REPOST_WORKERS
+from bot.logger import logger
+
+# Yagona taymer: (due_ts, seq, key, generation, handler, payload) elementlaridan iborat min-heap
+_heap: list = []
+_seq = itertools.count()
+_generations: dict = {}
+
+# Bitta key (masalan user) vazifalari ketma-ket bajariladi, qolganlari navbatda turadi
+_busy_keys: set = set()
+_backlog: dict = {}
+
+_queue: asyncio.Queue | None = None
+_wakeup: asyncio.Event | None = None
+_timer_task: asyncio.Task | None = None
+_worker_tasks: list[asyncio.Task] = []
+
+def schedule_at(due_ts: float, key, handler, payload=None):
+    """handler(key, payload) ni due_ts (unix vaqt) da bajarish uchun rejalashtiradi."""
+    entry = (due_ts, next(_seq), key, _generations.get(key, 0), handler, payload)
+    heapq.heappush(_heap, entry)
+    if _wakeup is not None and _heap[0] is entry:
+        _wakeup.set()
+
+def cancel_key(key):
+    """key ga tegishli barcha vazifalarni bekor qiladi (heapdagilar lazy tarzda tashlab yuboriladi)."""
+    _generations[key] = _generations.get(key, 0) + 1
+    _backlog.pop(key, None)
+
+def _is_stale(entry) -> bool:
+    return entry[3] != _generations.get(entry[2], 0)
+
+def _dispatch(entry):
+    key = entry[2]
+    if key in _busy_keys:
+        _backlog.setdefault(key, deque()).append(entry)
+    else:
+        _busy_keys.add(key)
+        _queue.put_nowait(entry)
+
+def _release_key(key):
+    waiting = _backlog.get(key)
+    while waiting:
+        entry = waiting.popleft()
+        if not _is_stale(entry):
+            _queue.put_nowait(entry)
+            return
+    _backlog.pop(key, None)
+    _busy_keys.discard(key)
+
+async def _timer_loop():
+    while True:
+        _wakeup.clear()
+        if not _heap:
+            await _wakeup.wait()
+            continue
+        delay = _heap[0][0] - time.time()
+        if delay > 0:
+            try:
+                await asyncio.wait_for(_wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        entry = heapq.heappop(_heap)
+        if not _is_stale(entry):
+            _dispatch(entry)
+
+async def _worker(n: int):
+    while True:
+        entry = await _queue.get()
+        _, _, key, _, handler, payload = entry
+        try:
+            if not _is_stale(entry):
+                await handler(key, payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"dispatcher worker {n} error (key={key}, handler={handler.__name__}): {e}", exc_info=True)
+        finally:
+            _release_key(key)
+            _queue.task_done()
+
+def start_dispatcher(workers: int = REPOST_WORKERS):
+    """Taymer va cheklangan ishchi (worker) havzasini ishga tushiradi."""
+    global _queue, _wakeup, _timer_task
+    if _timer_task and not _timer_task.done():
+        return
+    _queue = asyncio.Queue()
+    _wakeup = asyncio.Event()
+    _timer_task = asyncio.create_task(_timer_loop())
+    for n in range(workers):
+        _worker_tasks.append(asyncio.create_task(_worker(n)))
+    logger.info(f"Repost dispatcher started: {workers} workers")
+
+async def stop_dispatcher():
+    global _timer_task
+    tasks = [t for t in [_timer_task, *_worker_tasks] if t]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    _worker_tasks.clear()
+    _timer_task = None
+    logger.info("Repost dispatcher stopped")
@@ -0,0 +1,135 @@
+# telethon_client/entity_cache.py
+
+import asyncio
+import time
+from telethon import utils
+from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser, PeerChannel, PeerChat
+from config import ENTITY_CACHE_TTL
+from telethon_client.storage import open_db, transaction, in_db_thread
+from telethon_client.rate_limiter import limited_call, client_account
+from bot.logger import logger
+
+ENTITY_CACHE_DB_FILE = "entity_cache.sqlite3"
+
+# access_hash akkauntga xos — kesh (account, link) bo‘yicha
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    account TEXT NOT NULL,
+    link TEXT NOT NULL,
+    peer_id INTEGER NOT NULL,
+    access_hash INTEGER NOT NULL,
+    resolved_at REAL NOT NULL,
+    PRIMARY KEY (account, link)
+);
+"""
+
+# Xotiradagi nusxa: account -> {link: (peer_id, access_hash, resolved_at)}
+_memory: dict[str, dict[str, tuple[int, int, float]]] = {}
+# Bir xil link bir vaqtda ikki marta resolve qilinmaydi: (account, link) -> Task
+_inflight: dict[tuple[str, str], asyncio.Task] = {}
+# Telethon sessiyasiga allaqachon yozilgan peerlar: (account, peer_id)
+_primed: set[tuple[str, int]] = set()
+
+def _db():
+    return open_db(ENTITY_CACHE_DB_FILE, _SCHEMA)
+
+def _cache_link(link: str) -> str:
+    """Bir xil kanalning turli yozilishlari bitta kalitga tushadi (https://, @, katta-kichik harf)."""
+    link = link.strip()
+    for prefix in ("https://", "http://"):
+        if link.startswith(prefix):
+            link = link[len(prefix):]
+    if link.startswith("telegram.me/"):
+        link = "t.me/" + link[len("telegram.me/"):]
+    parts = link.split("/")
+    if parts[0] == "t.me" and len(parts) > 1 and parts[1] not in ("c", "joinchat") and not parts[1].startswith("+"):
+        link = "@" + parts[1]
+    # Invite hash katta-kichik harfga sezgir, username emas
+    return link.lower() if link.startswith("@") else link
+
+def _input_peer(peer_id: int, access_hash: int):
+    real_id, kind = utils.resolve_id(peer_id)
+    if kind is PeerChannel:
+        return InputPeerChannel(real_id, access_hash)
+    if kind is PeerChat:
+        return InputPeerChat(real_id)
+    return InputPeerUser(real_id, access_hash)
+
+@in_db_thread
+def _load_account(account: str) -> dict[str, tuple[int, int, float]]:
+    rows = _db().execute(
+        "SELECT link, peer_id, access_hash, resolved_at FROM entities WHERE account = ?", (account,)
+    ).fetchall()
+    return {row["link"]: (row["peer_id"], row["access_hash"], row["resolved_at"]) for row in rows}
+
+@in_db_thread
+def _save(account: str, link: str, peer_id: int, access_hash: int, resolved_at: float):
+    conn = _db()
+    with transaction(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO entities (account, link, peer_id, access_hash, resolved_at) VALUES (?, ?, ?, ?, ?)",
+            (account, link, peer_id, access_hash, resolved_at)
+        )
+
+@in_db_thread
+def _delete_account(account: str):
+    _db().execute("DELETE FROM entities WHERE account = ?", (account,))
+
+async def _account_cache(account: str) -> dict[str, tuple[int, int, float]]:
+    if account not in _memory:
+        _memory[account] = await _load_account(account)
+    return _memory[account]
+
+def _prime_session(client, account: str, input_peer):
+    # Telethon sessiyasi peer ni bilsa, keyingi chaqiriqlar (forward, iter_messages) tarmoqqa chiqmaydi
+    peer_id = utils.get_peer_id(input_peer)
+    if (account, peer_id) in _primed:
+        return
+    client.session.process_entities([input_peer])
+    _primed.add((account, peer_id))
+
+async def _resolve_remote(client, account: str, link: str, cache: dict):
+    input_peer = await limited_call(account, lambda: client.get_input_entity(link), kind="read")
+    peer_id = utils.get_peer_id(input_peer)
+    access_hash = getattr(input_peer, "access_hash", 0) or 0
+    resolved_at = time.time()
+    cache[link] = (peer_id, access_hash, resolved_at)
+    await _save(account, link, peer_id, access_hash, resolved_at)
+    _primed.add((account, peer_id))
+    logger.info(f"[ENTITY CACHE] resolved {link} → {peer_id} (account={account})")
+    return input_peer
+
+async def resolve(client, link: str):
+    """
+    Link/username ni shu akkaunt uchun InputPeer ga aylantiradi.
+    Natija diskda (ENTITY_CACHE_TTL gacha) saqlanadi — qayta ishga tushgandan keyin ham tarmoqqa chiqilmaydi.
+    Raqamli id lar keshlanmaydi (Telethon sessiyasidan olinadi).
+    """
+    if isinstance(link, int) or link.lstrip("-").isdigit():
+        return await client.get_input_entity(int(link))
+    account = client_account(client)
+    key = _cache_link(link)
+    cache = await _account_cache(account)
+    cached = cache.get(key)
+    if cached and time.time() - cached[2] < ENTITY_CACHE_TTL:
+        input_peer = _input_peer(cached[0], cached[1])
+        _prime_session(client, account, input_peer)
+        return input_peer
+
+    task = _inflight.get((account, key))
+    if task is None:
+        task = asyncio.ensure_future(_resolve_remote(client, account, key, cache))
+        _inflight[(account, key)] = task
+        task.add_done_callback(lambda _t: _inflight.pop((account, key), None))
+    return await asyncio.shield(task)
+
+async def resolve_peer_id(client, link: str) -> int:
+    """resolve() natijasining belgilangan (marked, masalan -100...) id si."""
+    return utils.get_peer_id(await resolve(client, link))
+
+async def forget_account(account: str):
+    """Akkaunt logout qilinganda uning keshini o‘chiradi (access_hash boshqa sessiyada yaroqsiz)."""
+    _memory.pop(account, None)
+    for key in [key for key in _primed if key[0] == account]:
+        _primed.discard(key)
+    await _delete_account(account)
@@ -0,0 +1,58 @@
+# telethon_client/inline_store.py
+
+import json
+import time
+from telethon_client.storage import open_db, in_db_thread
+from bot.logger import logger
+
+INLINE_DB_FILE = "inline_posts.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS inline_posts (
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (user_id, post_id)
+);
+"""
+
+def _db():
+    return open_db(INLINE_DB_FILE, _SCHEMA)
+
+@in_db_thread
+def upsert_post(user_id: int, post_data: dict):
+    """(user, post id) bo‘yicha postni yozadi yoki yangilaydi — bitta indekslangan yozuv, butun fayl emas."""
+    _db().execute(
+        "INSERT OR REPLACE INTO inline_posts (user_id, post_id, data, updated_at) VALUES (?, ?, ?, ?)",
+        (user_id, post_data["id"], json.dumps(post_data, ensure_ascii=False), time.time())
+    )
+    logger.info(f"Inline post saved: user={user_id}, post={post_data['id']}")
+
+@in_db_thread
+def get_post(user_id: int, post_id: int) -> dict | None:
+    row = _db().execute(
+        "SELECT data FROM inline_posts WHERE user_id = ? AND post_id = ?",
+        (user_id, post_id)
+    ).fetchone()
+    return json.loads(row["data"]) if row else None
+
+@in_db_thread
+def delete_post(user_id: int, post_id: int):
+    _db().execute("DELETE FROM inline_posts WHERE user_id = ? AND post_id = ?", (user_id, post_id))
+    logger.info(f"Inline post removed: user={user_id}, post={post_id}")
+
+@in_db_thread
+def list_posts(user_id: int | None = None) -> list[dict]:
+    if user_id is None:
+        rows = _db().execute("SELECT data FROM inline_posts").fetchall()
+    else:
+        rows = _db().execute("SELECT data FROM inline_posts WHERE user_id = ?", (user_id,)).fetchall()
+    return [json.loads(row["data"]) for row in rows]
+
+@in_db_thread
+def clear_posts(user_id: int | None = None):
+    if user_id is None:
+        _db().execute("DELETE FROM inline_posts")
+    else:
+        _db().execute("DELETE FROM inline_posts WHERE user_id = ?", (user_id,))
@@ -0,0 +1,180 @@
+# telethon_client/job_store.py
+
+import json
+import time
+from telethon_client.storage import open_db, transaction, in_db_thread
+from bot.logger import logger
+
+JOB_DB_FILE = "repost_jobs.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    user_id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    targets TEXT NOT NULL,
+    time_range TEXT NOT NULL,
+    utc_offset INTEGER NOT NULL DEFAULT 0,
+    start_repost_date TEXT,
+    next_archive_day TEXT,
+    idx INTEGER NOT NULL DEFAULT 0,
+    exhausted INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS planned_days (
+    user_id INTEGER NOT NULL,
+    planned_date TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, planned_date)
+);
+CREATE TABLE IF NOT EXISTS planned_posts (
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    planned_date TEXT NOT NULL,
+    due_ts REAL NOT NULL,
+    group_ids TEXT,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, post_id)
+);
+CREATE TABLE IF NOT EXISTS sent_log (
+    user_id INTEGER NOT NULL,
+    post_id INTEGER NOT NULL,
+    target TEXT NOT NULL,
+    sent_at REAL NOT NULL,
+    PRIMARY KEY (user_id, post_id, target)
+);
+"""
+
+# Barcha public funksiyalar awaitable: SQLite ishi storage DB threadida bajariladi
+
+def _db():
+    return open_db(JOB_DB_FILE, _SCHEMA)
+
+@in_db_thread
+def save_job(job: dict):
+    """Yangi repost ishini yozadi (userning eski rejasi va ledgeri o‘chiriladi)."""
+    conn = _db()
+    user_id = job["user_id"]
+    with transaction(conn):
+        _delete_user_rows(conn, user_id)
+        conn.execute(
+            "INSERT INTO jobs (user_id, source, targets, time_range, utc_offset, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, job["source"], json.dumps(job["targets"]), json.dumps(job["time_range"]), job["utc_offset"], time.time())
+        )
+    logger.info(f"job_store: job saved for user {user_id}")
+
+@in_db_thread
+def update_job(user_id: int, **fields):
+    if not fields:
+        return
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    _db().execute(f"UPDATE jobs SET {columns} WHERE user_id = ?", (*fields.values(), user_id))
+
+@in_db_thread
+def save_planned_day(user_id: int, planned_date: str, posts: list[tuple], idx: int, next_archive_day: str):
+    """
+    Bir kunlik rejani atomar yozadi.
+    posts: (post_id, due_ts, group_ids | None) ro‘yxati.
+    """
+    conn = _db()
+    with transaction(conn):
+        conn.execute(
+            "INSERT OR REPLACE INTO planned_days (user_id, planned_date, done) VALUES (?, ?, 0)",
+            (user_id, planned_date)
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO planned_posts (user_id, post_id, planned_date, due_ts, group_ids) VALUES (?, ?, ?, ?, ?)",
+            [(user_id, post_id, planned_date, due_ts, json.dumps(group_ids) if group_ids else None)
+             for post_id, due_ts, group_ids in posts]
+        )
+        conn.execute(
+            "UPDATE jobs SET idx = ?, next_archive_day = ? WHERE user_id = ?",
+            (idx, next_archive_day, user_id)
+        )
+
+@in_db_thread
+def mark_day_done(user_id: int, planned_date: str):
+    _db().execute(
+        "UPDATE planned_days SET done = 1 WHERE user_id = ? AND planned_date = ?",
+        (user_id, planned_date)
+    )
+
+@in_db_thread
+def mark_sent(user_id: int, post_id: int, targets: list[str], done: bool = True):
+    """
+    Per-post checkpoint: post shu targetlarga yuborildi (ledger).
+    done=True bo‘lsa post qayta ishlanmaydi (muvaffaqiyatsiz targetlar ham keyin qayta yuborilmaydi).
+    """
+    now = time.time()
+    conn = _db()
+    with transaction(conn):
+        conn.executemany(
+            "INSERT OR IGNORE INTO sent_log (user_id, post_id, target, sent_at) VALUES (?, ?, ?, ?)",
+            [(user_id, post_id, target, now) for target in targets]
+        )
+        if done:
+            conn.execute(
+                "UPDATE planned_posts SET done = 1 WHERE user_id = ? AND post_id = ?",
+                (user_id, post_id)
+            )
+
+@in_db_thread
+def get_sent_targets(user_id: int, post_id: int) -> set[str]:
+    return _sent_targets(_db(), user_id, post_id)
+
+def _sent_targets(conn, user_id: int, post_id: int) -> set[str]:
+    rows = conn.execute(
+        "SELECT target FROM sent_log WHERE user_id = ? AND post_id = ?",
+        (user_id, post_id)
+    ).fetchall()
+    return {row["target"] for row in rows}
+
+@in_db_thread
+def load_jobs() -> list[dict]:
+    """Restart’dan keyin tiklash uchun barcha ishlarni, kunlarini va yuborilmagan postlarini qaytaradi."""
+    conn = _db()
+    jobs = []
+    for row in conn.execute("SELECT * FROM jobs").fetchall():
+        user_id = row["user_id"]
+        days = conn.execute(
+            "SELECT planned_date FROM planned_days WHERE user_id = ? AND done = 0 ORDER BY planned_date",
+            (user_id,)
+        ).fetchall()
+        posts = conn.execute(
+            "SELECT post_id, planned_date, due_ts, group_ids FROM planned_posts "
+            "WHERE user_id = ? AND done = 0 ORDER BY due_ts, post_id",
+            (user_id,)
+        ).fetchall()
+        jobs.append({
+            "user_id": user_id,
+            "source": row["source"],
+            "targets": json.loads(row["targets"]),
+            "time_range": json.loads(row["time_range"]),
+            "utc_offset": row["utc_offset"],
+            "start_repost_date": row["start_repost_date"],
+            "next_archive_day": row["next_archive_day"],
+            "idx": row["idx"],
+            "exhausted": bool(row["exhausted"]),
+            "open_days": [d["planned_date"] for d in days],
+            "posts": [
+                {
+                    "post_id": p["post_id"],
+                    "planned_date": p["planned_date"],
+                    "due_ts": p["due_ts"],
+                    "group_ids": json.loads(p["group_ids"]) if p["group_ids"] else None,
+                    "sent_targets": _sent_targets(conn, user_id, p["post_id"]),
+                }
+                for p in posts
+            ],
+        })
+    return jobs
+
+def _delete_user_rows(conn, user_id: int):
+    for table in ("jobs", "planned_days", "planned_posts", "sent_log"):
+        conn.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
+
+@in_db_thread
+def delete_job(user_id: int):
+    conn = _db()
+    with transaction(conn):
+        _delete_user_rows(conn, user_id)
+    logger.info(f"job_store: job removed for user {user_id}")
@@ -0,0 +1,251 @@
+# telethon_client/media_cache.py
+
+import asyncio
+import hashlib
+import os
+import time
+from config import MEDIA_CACHE_FOLDER, MEDIA_CACHE_QUOTA_BYTES, MEDIA_CACHE_GC_INTERVAL
+from telethon_client.storage import open_db, transaction, in_db_thread, run_io
+from bot.logger import logger
+
+MEDIA_CACHE_DB_FILE = "media_cache.sqlite3"
+
+# blobs: kontent hash bo‘yicha bitta fayl; refcount — hozir uni yuborayotganlar soni (0 bo‘lsa evict qilinishi mumkin)
+# media_keys: Telegram media identifikatori (document/photo id) -> hash
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blobs_lru ON blobs (refcount, last_used);
+CREATE TABLE IF NOT EXISTS media_keys (
+    media_key TEXT PRIMARY KEY,
+    hash TEXT NOT NULL
+);
+"""
+
+_READ_CHUNK = 1024 * 1024
+
+_gc_task: asyncio.Task | None = None
+
+def _db():
+    return open_db(MEDIA_CACHE_DB_FILE, _SCHEMA)
+
+def media_key(msg) -> str | None:
+    """Xabardagi media ning barqaror identifikatori (bir xil fayl boshqa postlarda ham shu kalitga ega)."""
+    media = getattr(msg, "media", None)
+    document = getattr(media, "document", None)
+    if document is not None:
+        return f"doc:{document.id}"
+    photo = getattr(media, "photo", None)
+    if photo is not None:
+        return f"photo:{photo.id}"
+    return None
+
+def _blob_path(content_hash: str) -> str:
+    return os.path.join(MEDIA_CACHE_FOLDER, content_hash[:2], content_hash)
+
+# === Fayl tomoni (run_io orqali chaqiriladi) ===
+
+def _ingest_fileobj(fileobj) -> tuple[str, str, int]:
+    """Fayl obyektini vaqtinchalik faylga ko‘chiradi va bir vaqtda sha256 hisoblaydi."""
+    os.makedirs(MEDIA_CACHE_FOLDER, exist_ok=True)
+    tmp_path = os.path.join(MEDIA_CACHE_FOLDER, f".incoming-{os.getpid()}-{id(fileobj)}")
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    with open(tmp_path, "wb") as out:
+        while chunk := fileobj.read(_READ_CHUNK):
+            digest.update(chunk)
+            out.write(chunk)
+            size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), tmp_path, size
+
+def _ingest_path(path: str) -> tuple[str, str, int]:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_READ_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest(), path, os.path.getsize(path)
+
+def _place_blob(tmp_path: str, content_hash: str) -> str:
+    """Faylni hash nomi bilan keshga joylaydi; shu kontent allaqachon bo‘lsa nusxa o‘chiriladi."""
+    path = _blob_path(content_hash)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+    return path
+
+def _remove_paths(paths: list[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"[MEDIA CACHE] could not remove {path}: {e}")
+
+def _list_blob_files(min_age: float) -> set[str]:
+    """Keshdagi fayllar; yaqinda yozilganlari (hali indeksga tushmagan bo‘lishi mumkin) olinmaydi."""
+    found = set()
+    if not os.path.isdir(MEDIA_CACHE_FOLDER):
+        return found
+    cutoff = time.time() - min_age
+    for root, _dirs, files in os.walk(MEDIA_CACHE_FOLDER):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    found.add(path)
+            except OSError:
+                pass
+    return found
+
+# === Indeks tomoni (DB threadida) ===
+
+@in_db_thread
+def _acquire(key: str) -> tuple[str, str] | None:
+    conn = _db()
+    row = conn.execute(
+        "SELECT b.hash, b.path FROM media_keys k JOIN blobs b ON b.hash = k.hash WHERE k.media_key = ?", (key,)
+    ).fetchone()
+    if row is None:
+        return None
+    conn.execute("UPDATE blobs SET refcount = refcount + 1, last_used = ? WHERE hash = ?", (time.time(), row["hash"]))
+    return row["hash"], row["path"]
+
+@in_db_thread
+def _register(key: str | None, content_hash: str, path: str, size: int):
+    conn = _db()
+    with transaction(conn):
+        conn.execute(
+            "INSERT INTO blobs (hash, path, size, refcount, last_used) VALUES (?, ?, ?, 1, ?) "
+            "ON CONFLICT(hash) DO UPDATE SET refcount = refcount + 1, last_used = excluded.last_used",
+            (content_hash, path, size, time.time())
+        )
+        if key:
+            conn.execute("INSERT OR REPLACE INTO media_keys (media_key, hash) VALUES (?, ?)", (key, content_hash))
+
+@in_db_thread
+def _forget(content_hash: str):
+    conn = _db()
+    with transaction(conn):
+        conn.execute("DELETE FROM media_keys WHERE hash = ?", (content_hash,))
+        conn.execute("DELETE FROM blobs WHERE hash = ?", (content_hash,))
+
+@in_db_thread
+def release(content_hash: str):
+    """Yuborish tugadi: refcount kamayadi, blob LRU bo‘yicha evict qilinishi mumkin bo‘ladi."""
+    _db().execute(
+        "UPDATE blobs SET refcount = MAX(refcount - 1, 0), last_used = ? WHERE hash = ?",
+        (time.time(), content_hash)
+    )
+
+@in_db_thread
+def _select_evictions(quota: int) -> list[tuple[str, str]]:
+    """Kesh hajmi quota dan oshsa, ishlatilmayotgan (refcount=0) eng eski bloblarni indeksdan chiqaradi."""
+    conn = _db()
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+    if total <= quota:
+        return []
+    evicted = []
+    with transaction(conn):
+        for row in conn.execute(
+            "SELECT hash, path, size FROM blobs WHERE refcount = 0 ORDER BY last_used"
+        ).fetchall():
+            if total <= quota:
+                break
+            conn.execute("DELETE FROM media_keys WHERE hash = ?", (row["hash"],))
+            conn.execute("DELETE FROM blobs WHERE hash = ?", (row["hash"],))
+            total -= row["size"]
+            evicted.append((row["hash"], row["path"]))
+    return evicted
+
+@in_db_thread
+def _indexed_paths() -> set[str]:
+    return {row["path"] for row in _db().execute("SELECT path FROM blobs")}
+
+@in_db_thread
+def _reset_refcounts():
+    # Jarayon qayta ishga tushganda oldingi yuborishlar tugagan — "in use" belgilari eskirgan
+    _db().execute("UPDATE blobs SET refcount = 0 WHERE refcount != 0")
+
+# === Public API ===
+
+async def acquire(key: str | None) -> tuple[str, str] | None:
+    """
+    media_key bo‘yicha keshdagi faylni (hash, path) qaytaradi va refcount ni oshiradi.
+    Yo‘q bo‘lsa (yoki fayl diskdan yo‘qolgan bo‘lsa) None. Ishlatib bo‘lgach release(hash) chaqiring.
+    """
+    if not key:
+        return None
+    hit = await _acquire(key)
+    if hit is None:
+        return None
+    content_hash, path = hit
+    if not await run_io(os.path.exists, path):
+        logger.warning(f"[MEDIA CACHE] blob missing on disk, dropping index entry: {path}")
+        await _forget(content_hash)
+        return None
+    logger.info(f"[MEDIA CACHE] hit {key} → {content_hash[:12]}")
+    return hit
+
+async def store(key: str | None, fileobj=None, path: str | None = None) -> tuple[str, str]:
+    """
+    Yangi yuklangan media ni keshga qo‘shadi (fileobj — nusxalanadi, path — keshga ko‘chiriladi).
+    Bir xil kontent faqat bir marta saqlanadi. refcount 1 bilan qaytadi: (hash, path).
+    """
+    if path is not None:
+        content_hash, tmp_path, size = await run_io(_ingest_path, path)
+    else:
+        content_hash, tmp_path, size = await run_io(_ingest_fileobj, fileobj)
+    blob_path = await run_io(_place_blob, tmp_path, content_hash)
+    await _register(key, content_hash, blob_path, size)
+    logger.info(f"[MEDIA CACHE] stored {key} → {content_hash[:12]} ({size} bytes)")
+    if size:
+        await evict()
+    return content_hash, blob_path
+
+async def evict(quota: int = MEDIA_CACHE_QUOTA_BYTES) -> int:
+    """Quota dan oshgan qismni LRU tartibida o‘chiradi (faqat hozir ishlatilmayotgan bloblar)."""
+    evicted = await _select_evictions(quota)
+    if evicted:
+        await run_io(_remove_paths, [path for _hash, path in evicted])
+        logger.info(f"[MEDIA CACHE] evicted {len(evicted)} blobs (LRU, quota {quota} bytes)")
+    return len(evicted)
+
+async def collect_garbage() -> int:
+    """Indeksda yo‘q fayllarni (uzilgan yozuvlar, .incoming qoldiqlari) o‘chiradi va quota ni tekshiradi."""
+    on_disk = await run_io(_list_blob_files, MEDIA_CACHE_GC_INTERVAL)
+    orphans = sorted(on_disk - await _indexed_paths())
+    if orphans:
+        await run_io(_remove_paths, orphans)
+        logger.info(f"[MEDIA CACHE] GC removed {len(orphans)} orphan files")
+    return len(orphans) + await evict()
+
+async def _gc_loop():
+    while True:
+        await asyncio.sleep(MEDIA_CACHE_GC_INTERVAL)
+        try:
+            await collect_garbage()
+        except Exception as e:
+            logger.error(f"[MEDIA CACHE] GC error: {e}", exc_info=True)
+
+async def start_media_cache_gc():
+    global _gc_task
+    await _reset_refcounts()
+    if _gc_task is None or _gc_task.done():
+        _gc_task = asyncio.create_task(_gc_loop())
+        logger.info("Media cache GC started")
+
+def stop_media_cache_gc():
+    global _gc_task
+    if _gc_task and not _gc_task.done():
+        _gc_task.cancel()
+    _gc_task = None
@@ -0,0 +1,160 @@
+# telethon_client/media_downloader.py
+
+import asyncio
+import json
+import os
+import time
+from config import DOWNLOAD_PART_SIZE, DOWNLOAD_CONCURRENCY_PER_ACCOUNT
+from telethon_client.rate_limiter import limited_call, client_account
+from bot.logger import logger
+from telethon_client.storage import run_io, run_db
+
+# Telegram upload.getFile bitta so‘rovda ko‘pi bilan 512 KB qaytaradi
+_REQUEST_SIZE = 512 * 1024
+
+# Akkaunt bo‘yicha bir vaqtda yuklanayotgan qismlar: phone -> Semaphore (barcha fayllar uchun umumiy)
+_account_slots: dict[str, asyncio.Semaphore] = {}
+# Bitta faylni bir vaqtda ikki marta yuklamaslik uchun: path -> {"lock": Lock, "users": kutayotgan/yuklayotganlar}
+# Yuklash tugab, hech kim kutmasa yozuv o‘chiriladi — lug‘at faqat hozirgi yuklashlar bilan o‘sadi
+_file_locks: dict[str, dict] = {}
+
+def _slots(account: str) -> asyncio.Semaphore:
+    if account not in _account_slots:
+        _account_slots[account] = asyncio.Semaphore(DOWNLOAD_CONCURRENCY_PER_ACCOUNT)
+    return _account_slots[account]
+
+def _part_paths(path: str) -> tuple[str, str]:
+    return path + ".part", path + ".part.json"
+
+def _load_done_parts(state_path: str, size: int) -> set[int]:
+    """Oldingi (uzilgan) yuklashdan tayyor qismlar. Hajm yoki qism o‘lchami o‘zgargan bo‘lsa — boshidan."""
+    try:
+        with open(state_path, "r") as f:
+            state = json.load(f)
+        if state.get("size") == size and state.get("part_size") == DOWNLOAD_PART_SIZE:
+            return set(state.get("done", []))
+    except (OSError, ValueError):
+        pass
+    return set()
+
+def _save_done_parts(state_path: str, size: int, done: list[int]):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"size": size, "part_size": DOWNLOAD_PART_SIZE, "done": done}, f)
+    os.replace(tmp_path, state_path)
+
+def _open_part_file(part_path: str, size: int) -> int:
+    os.makedirs(os.path.dirname(part_path) or ".", exist_ok=True)
+    fd = os.open(part_path, os.O_RDWR | os.O_CREAT, 0o644)
+    os.ftruncate(fd, size)
+    return fd
+
+def _finalize(path: str):
+    part_path, state_path = _part_paths(path)
+    os.replace(part_path, path)
+    if os.path.exists(state_path):
+        os.remove(state_path)
+
+async def fetch_request(client, media, offset: int, account: str | None = None) -> bytes:
+    """
+    Bitta upload.getFile so‘rovi (offset dan _REQUEST_SIZE bayt). Har so‘rov akkaunt schedulerining alohida
+    slotida ketadi — katta yuklash slotni uzoq band qilib, interactive so‘rovlarni to‘sib qo‘ymaydi.
+    Fayl oxirida qisqaroq (yoki bo‘sh) bo‘lak qaytadi.
+    """
+    async def fetch():
+        # async with — boshqa DC ning exported sender i har so‘rovdan keyin qaytariladi
+        async with client.iter_download(media, offset=offset, limit=1, request_size=_REQUEST_SIZE) as stream:
+            async for chunk in stream:
+                return bytes(chunk)
+        return b""
+
+    return await limited_call(account or client_account(client), fetch, kind="download")
+
+async def stream_download(client, media, account: str | None = None):
+    """Media ni boshidan oxirigacha so‘rovma-so‘rov (fetch_request) o‘qiydi va bo‘laklarni yield qiladi."""
+    offset = 0
+    while True:
+        chunk = await fetch_request(client, media, offset, account)
+        if chunk:
+            yield chunk
+        if len(chunk) < _REQUEST_SIZE:
+            return
+        offset += len(chunk)
+
+def remove_download(path: str | None) -> bool:
+    """Yuklangan faylni va uning .part qoldiqlarini o‘chiradi (bloklovchi — run_io orqali chaqiring)."""
+    if not path:
+        return False
+    removed = False
+    for candidate in (path, *_part_paths(path)):
+        if os.path.exists(candidate):
+            os.remove(candidate)
+            removed = True
+    return removed
+
+async def download_parallel(client, media, path: str, size: int, label: str = "") -> str:
+    """
+    Katta media ni DOWNLOAD_PART_SIZE qismlarga bo‘lib parallel yuklaydi va path ga yozadi.
+    - akkaunt bo‘yicha bir vaqtdagi qismlar soni DOWNLOAD_CONCURRENCY_PER_ACCOUNT bilan cheklangan
+    - tayyor qismlar .part.json da saqlanadi: uzilgan yuklash keyingi urinishda davom etadi
+    - fayl faqat barcha qismlar yozilgach .part dan path ga o‘tkaziladi (yarim fayl hech qachon ko‘rinmaydi)
+    """
+    entry = _file_locks.setdefault(path, {"lock": asyncio.Lock(), "users": 0})
+    entry["users"] += 1
+    try:
+        async with entry["lock"]:
+            return await _download_parts(client, media, path, size, label)
+    finally:
+        entry["users"] -= 1
+        if entry["users"] == 0:
+            del _file_locks[path]
+
+async def _download_parts(client, media, path: str, size: int, label: str) -> str:
+    """download_parallel ning o‘zi — fayl lock i ostida chaqiriladi."""
+    account = client_account(client)
+    part_path, state_path = _part_paths(path)
+    if await run_io(os.path.exists, path):
+        return path
+
+    total_parts = max(1, -(-size // DOWNLOAD_PART_SIZE))
+    done = await run_io(_load_done_parts, state_path, size)
+    pending = [i for i in range(total_parts) if i not in done]
+    if done:
+        logger.info(f"[DOWNLOAD] {label} resuming: {len(done)}/{total_parts} parts already on disk")
+
+    fd = await run_io(_open_part_file, part_path, size)
+    started = time.monotonic()
+    progress = {"parts": len(done), "reported": 0}
+
+    async def fetch_part(index):
+        offset = index * DOWNLOAD_PART_SIZE
+        chunks = []
+
+        async with _slots(account):
+            for request_offset in range(offset, min(offset + DOWNLOAD_PART_SIZE, size), _REQUEST_SIZE):
+                chunks.append(await fetch_request(client, media, request_offset, account))
+        await run_io(os.pwrite, fd, b"".join(chunks), offset)
+        done.add(index)
+        # Holat fayli yagona storage threadida ketma-ket yoziladi (oxirgi snapshot eng to‘liq)
+        await run_db(_save_done_parts, state_path, size, sorted(done))
+
+        progress["parts"] += 1
+        percent = progress["parts"] * 100 // total_parts
+        if percent >= progress["reported"] + 10 or progress["parts"] == total_parts:
+            progress["reported"] = percent
+            logger.info(f"[DOWNLOAD] {label} {percent}% ({progress['parts']}/{total_parts} parts)")
+
+    try:
+        # Bitta qism xatosi qolganlarini to‘xtatmaydi — tayyorlari keyingi urinish uchun saqlanadi
+        results = await asyncio.gather(*(fetch_part(i) for i in pending), return_exceptions=True)
+    finally:
+        await run_io(os.close, fd)
+    errors = [r for r in results if isinstance(r, BaseException)]
+    if errors:
+        logger.warning(f"[DOWNLOAD] {label} {len(errors)} parts failed, partial download kept for resume")
+        raise errors[0]
+
+    await run_io(_finalize, path)
+    elapsed = time.monotonic() - started
+    logger.info(f"[DOWNLOAD] {label} done: {size} bytes in {elapsed:.1f}s → {path}")
+    return path
@@ -0,0 +1,108 @@
+# telethon_client/memory_session.py
+
+import os
+import time
+from telethon.sessions import MemorySession, SQLiteSession
+
+class PersistentMemorySession(MemorySession):
+    """
+    Telethon sessiyasi xotirada (auth key, entity lar, update holati) — har bir o‘zgarishda diskka yozilmaydi.
+    O‘zgarish bo‘lsa dirty belgilanadi; session_manager uni vaqti-vaqti bilan .session fayliga flush qiladi.
+    Fayl formati oddiy Telethon SQLite sessiyasi bilan bir xil.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.dirty = False
+
+    def set_dc(self, dc_id, server_address, port):
+        super().set_dc(dc_id, server_address, port)
+        self.dirty = True
+
+    @MemorySession.auth_key.setter
+    def auth_key(self, value):
+        self._auth_key = value
+        self.dirty = True
+
+    @MemorySession.takeout_id.setter
+    def takeout_id(self, value):
+        self._takeout_id = value
+        self.dirty = True
+
+    def process_entities(self, tlo):
+        before = len(self._entities)
+        super().process_entities(tlo)
+        if len(self._entities) != before:
+            self.dirty = True
+
+    def set_update_state(self, entity_id, state):
+        super().set_update_state(entity_id, state)
+        self.dirty = True
+
+    def save(self):
+        # Telethon buni tez-tez chaqiradi — diskka yozish flush ga qoldiriladi
+        pass
+
+    def snapshot(self) -> dict:
+        """Flush uchun holat nusxasi (event loopda olinadi, diskka boshqa threadda yoziladi)."""
+        self.dirty = False
+        return {
+            "dc": (self._dc_id, self._server_address, self._port),
+            "auth_key": self._auth_key,
+            "takeout_id": self._takeout_id,
+            "entities": list(self._entities),
+            "update_states": list(self._update_states.items()),
+        }
+
+    @classmethod
+    def load(cls, path: str) -> "PersistentMemorySession":
+        """Mavjud .session faylni xotiraga o‘qiydi (bloklovchi)."""
+        session = cls()
+        disk = SQLiteSession(path)
+        try:
+            if disk.dc_id:
+                session.set_dc(disk.dc_id, disk.server_address, disk.port)
+            session._auth_key = disk.auth_key
+            session._takeout_id = disk.takeout_id
+            cursor = disk._cursor()
+            try:
+                session._entities = set(cursor.execute(
+                    "SELECT id, hash, username, phone, name FROM entities"
+                ).fetchall())
+            finally:
+                cursor.close()
+            for entity_id, state in disk.get_update_states():
+                session._update_states[entity_id] = state
+        finally:
+            disk.close()
+        session.dirty = False
+        return session
+
+def write_snapshot(path: str, snapshot: dict):
+    """
+    Snapshot ni .session fayliga yozadi (bloklovchi): avval vaqtinchalik faylga,
+    keyin atomar almashtiriladi — fayl hech qachon yarim yozilgan holatda bo‘lmaydi.
+    """
+    tmp_name = f"{path}.flush"
+    if os.path.exists(f"{tmp_name}.session"):
+        os.remove(f"{tmp_name}.session")  # oldingi uzilgan flush qoldig‘i
+    disk = SQLiteSession(tmp_name)
+    try:
+        disk.set_dc(*snapshot["dc"])
+        disk.auth_key = snapshot["auth_key"]
+        disk.takeout_id = snapshot["takeout_id"]
+        now = int(time.time())
+        cursor = disk._cursor()
+        try:
+            cursor.execute("DELETE FROM entities")
+            cursor.executemany(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?, ?)",
+                [row + (now,) for row in snapshot["entities"]]
+            )
+        finally:
+            cursor.close()
+        for entity_id, state in snapshot["update_states"]:
+            disk.set_update_state(entity_id, state)
+    finally:
+        disk.close()
+    os.replace(disk.filename, f"{path}.session")
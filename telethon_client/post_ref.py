@@ -0,0 +1,53 @@
+# telethon_client/post_ref.py
+
+from datetime import timezone
+
+KIND_SINGLE = "single"
+KIND_GROUP = "group"
+KIND_INLINE = "inline"
+
+def message_ts(msg) -> float:
+    """Xabar vaqti (UTC, unix sekund)."""
+    return msg.date.replace(tzinfo=timezone.utc).timestamp()
+
+class PostRef:
+    """
+    Rejadagi post uchun ixcham havola. Scheduler kun davomida to‘liq Telethon Message larni
+    (entities, media, TL daraxti) saqlamaydi — kerak bo‘lsa xabar yuborish vaqtida qayta olinadi.
+    kind=None — turi noma’lum (masalan, restartdan tiklangan post): yuborishda xabar olinib aniqlanadi.
+    """
+    __slots__ = ("id", "group_ids", "ts", "kind", "has_markup", "staged", "requeued")
+
+    def __init__(self, id: int, ts: float, kind: str | None, group_ids: tuple[int, ...] | None = None,
+                 has_markup: bool = False):
+        self.id = id
+        self.group_ids = group_ids
+        self.ts = ts
+        self.kind = kind
+        self.has_markup = has_markup
+        self.staged = False
+        self.requeued = False
+
+    @classmethod
+    def from_message(cls, msg) -> "PostRef":
+        has_markup = bool(getattr(msg, "reply_markup", None))
+        return cls(
+            msg.id,
+            message_ts(msg),
+            KIND_INLINE if has_markup else KIND_SINGLE,
+            has_markup=has_markup,
+        )
+
+    @classmethod
+    def from_group(cls, members: list[tuple[int, float]]) -> "PostRef":
+        """members: albom xabarlarining (id, ts) juftlari."""
+        members = sorted(members)
+        first_id, first_ts = members[0]
+        return cls(first_id, first_ts, KIND_GROUP, group_ids=tuple(member_id for member_id, _ in members))
+
+    @property
+    def ids(self) -> list[int]:
+        return list(self.group_ids) if self.group_ids else [self.id]
+
+    def __repr__(self):
+        return f"PostRef(id={self.id}, kind={self.kind}, group_ids={self.group_ids})"
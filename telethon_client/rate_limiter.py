@@ -0,0 +1,191 @@
+# telethon_client/rate_limiter.py
+
+import asyncio
+import json
+import os
+import time
+from telethon.errors import FloodWaitError
+from config import (
+    ACCOUNT_SEND_RATE, ACCOUNT_SEND_BURST, ACCOUNT_READ_RATE, ACCOUNT_READ_BURST,
+    ACCOUNT_DOWNLOAD_RATE, ACCOUNT_DOWNLOAD_BURST,
+    TARGET_SEND_RATE, TARGET_SEND_BURST, FLOOD_WAIT_RETRIES, FLOOD_WAIT_INLINE_MAX,
+    ADAPTIVE_RATE_FILE, ADAPTIVE_MIN_RATE, ADAPTIVE_MAX_RATE, ADAPTIVE_INCREASE_STEP,
+    ADAPTIVE_INCREASE_EVERY, ADAPTIVE_DECREASE_FACTOR
+)
+from telethon_client.session_manager import get_client_phone
+from telethon_client.storage import run_io, run_db
+from telethon_client.account_scheduler import run_on_account, current_priority, PRIORITY_INTERACTIVE
+from bot.logger import logger
+
+# Token bucketlar: key -> {"rate", "burst", "tokens", "updated"}
+_buckets: dict = {}
+# FloodWait olgan akkauntlar: phone -> pauza tugash vaqti (monotonic)
+_paused_until: dict[str, float] = {}
+
+# Adaptiv (AIMD) o‘rganilgan send tezliklari: phone -> so‘rov/sekund (restartlar orasida saqlanadi)
+_learned_rates: dict[str, float] | None = None
+_success_counts: dict[str, int] = {}
+_pending_writes: set[asyncio.Future] = set()
+
+_ACCOUNT_LIMITS = {
+    "read": (ACCOUNT_READ_RATE, ACCOUNT_READ_BURST),
+    "download": (ACCOUNT_DOWNLOAD_RATE, ACCOUNT_DOWNLOAD_BURST),
+}
+
+class AccountPausedError(Exception):
+    """Akkaunt uzoq FloodWait pauzasida — chaqiriq bajarilmadi, keyinroq qayta navbatga qo‘yish kerak."""
+    def __init__(self, account: str, seconds: float):
+        super().__init__(f"account {account} is paused for {int(seconds)}s")
+        self.account = account
+        self.seconds = seconds
+
+def client_account(client) -> str:
+    """Rate limiter uchun akkaunt kaliti (pooled client telefon raqami)."""
+    return get_client_phone(client) or f"client-{id(client)}"
+
+def _bucket(key, rate, burst) -> dict:
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = {"rate": rate, "burst": burst, "tokens": float(burst), "updated": time.monotonic()}
+        _buckets[key] = bucket
+    return bucket
+
+async def _take(bucket: dict, urgent: bool = False):
+    """
+    Bucketdan bitta token oladi, yetmasa to‘lguncha kutadi.
+    urgent (interactive lane) kutayotgan bo‘lsa, background chaqiriqlar tokenni unga qoldiradi.
+    """
+    if urgent:
+        bucket["urgent"] = bucket.get("urgent", 0) + 1
+    try:
+        while True:
+            now = time.monotonic()
+            bucket["tokens"] = min(bucket["burst"], bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"])
+            bucket["updated"] = now
+            if bucket["tokens"] >= 1 and (urgent or not bucket.get("urgent")):
+                bucket["tokens"] -= 1
+                return
+            missing = 1 - bucket["tokens"] if bucket["tokens"] < 1 else 1
+            await asyncio.sleep(missing / bucket["rate"])
+    finally:
+        if urgent:
+            bucket["urgent"] -= 1
+
+def _load_learned_rates() -> dict[str, float]:
+    global _learned_rates
+    if _learned_rates is None:
+        _learned_rates = {}
+        if os.path.exists(ADAPTIVE_RATE_FILE):
+            try:
+                with open(ADAPTIVE_RATE_FILE, "r") as f:
+                    _learned_rates = {k: float(v) for k, v in json.load(f).items()}
+                logger.info(f"[RATE] learned send rates loaded: {_learned_rates}")
+            except Exception as e:
+                logger.error(f"[RATE] learned rates load error: {e}", exc_info=True)
+    return _learned_rates
+
+async def load_learned_rates():
+    """Startupda o‘rganilgan tezliklarni I/O threadida o‘qiydi."""
+    await run_io(_load_learned_rates)
+
+def _write_learned_rates(rates: dict[str, float]):
+    try:
+        os.makedirs(os.path.dirname(ADAPTIVE_RATE_FILE), exist_ok=True)
+        tmp_path = ADAPTIVE_RATE_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(rates, f, indent=2)
+        os.replace(tmp_path, ADAPTIVE_RATE_FILE)
+    except Exception as e:
+        logger.error(f"[RATE] learned rates save error: {e}", exc_info=True)
+
+def _save_learned_rates():
+    # Snapshot yagona storage threadida ketma-ket yoziladi (eski snapshot yangisini bosib ketmaydi)
+    task = asyncio.ensure_future(run_db(_write_learned_rates, dict(_learned_rates)))
+    _pending_writes.add(task)
+    task.add_done_callback(_pending_writes.discard)
+
+def _send_bucket(account: str) -> dict:
+    rate = _load_learned_rates().get(account, ACCOUNT_SEND_RATE)
+    return _bucket((account, "send"), rate, ACCOUNT_SEND_BURST)
+
+def _set_send_rate(account: str, rate: float, reason: str):
+    rate = round(min(ADAPTIVE_MAX_RATE, max(ADAPTIVE_MIN_RATE, rate)), 3)
+    bucket = _send_bucket(account)
+    if rate == bucket["rate"]:
+        return
+    logger.info(f"[RATE] account {account} send rate {bucket['rate']} → {rate} req/s ({reason})")
+    bucket["rate"] = rate
+    if account.startswith("client-"):
+        return  # pool tashqarisidagi client — saqlanmaydi
+    _load_learned_rates()[account] = rate
+    _save_learned_rates()
+
+def _on_send_success(account: str):
+    """Additive increase: har ADAPTIVE_INCREASE_EVERY muvaffaqiyatli yuborishda tezlik oshadi."""
+    count = _success_counts.get(account, 0) + 1
+    if count >= ADAPTIVE_INCREASE_EVERY:
+        count = 0
+        _set_send_rate(account, _send_bucket(account)["rate"] + ADAPTIVE_INCREASE_STEP, "no FloodWait")
+    _success_counts[account] = count
+
+def _on_send_flood(account: str):
+    """Multiplicative decrease: FloodWait bo‘lsa tezlik kamayadi."""
+    _success_counts[account] = 0
+    _set_send_rate(account, _send_bucket(account)["rate"] * ADAPTIVE_DECREASE_FACTOR, "FloodWait")
+
+def get_send_rate(account: str) -> float:
+    return _send_bucket(account)["rate"]
+
+def pause_account(account: str, seconds: float):
+    until = time.monotonic() + seconds
+    if until > _paused_until.get(account, 0):
+        _paused_until[account] = until
+    logger.warning(f"[RATE] account {account} paused for {int(seconds)}s (FloodWait)")
+
+def paused_for(account: str) -> float:
+    """Akkaunt pauzasi tugashiga qolgan sekundlar (0 — pauza yo‘q)."""
+    return max(0.0, _paused_until.get(account, 0) - time.monotonic())
+
+async def _wait_if_paused(account: str):
+    while True:
+        delay = paused_for(account)
+        if delay <= 0:
+            _paused_until.pop(account, None)
+            return
+        if delay > FLOOD_WAIT_INLINE_MAX:
+            raise AccountPausedError(account, delay)
+        await asyncio.sleep(delay)
+
+async def limited_call(account: str, fn, target=None, kind: str = "send", retries: int = FLOOD_WAIT_RETRIES):
+    """
+    fn() ni akkaunt (va target) token bucketlari orqali, akkaunt scheduleri slotida chaqiradi.
+    Ustuvorlik joriy lane dan olinadi (account_scheduler.interactive()).
+    FloodWait bo‘lsa faqat shu akkaunt pauzaga qo‘yiladi: qisqa pauzada chaqiriq kutib qayta uriniladi,
+    uzun pauzada AccountPausedError ko‘tariladi (chaqiruvchi ishni qayta navbatga qo‘yadi).
+    """
+    urgent = current_priority() == PRIORITY_INTERACTIVE
+    attempt = 0
+    while True:
+        await _wait_if_paused(account)
+        if kind == "send":
+            await _take(_send_bucket(account), urgent)
+        else:
+            rate, burst = _ACCOUNT_LIMITS[kind]
+            await _take(_bucket((account, kind), rate, burst), urgent)
+        if target is not None:
+            await _take(_bucket((account, "target", target), TARGET_SEND_RATE, TARGET_SEND_BURST), urgent)
+        try:
+            result = await run_on_account(account, fn)
+        except FloodWaitError as e:
+            # Parallel so‘rovlar bir FloodWait ni birdan olsa, tezlik shu epizod uchun faqat bir marta kamaytiriladi
+            new_episode = paused_for(account) <= 0
+            pause_account(account, e.seconds)
+            if kind == "send" and new_episode:
+                _on_send_flood(account)
+            attempt += 1
+            if attempt > retries or e.seconds > FLOOD_WAIT_INLINE_MAX:
+                raise AccountPausedError(account, e.seconds) from e
+            continue
+        if kind == "send":
+            _on_send_success(account)
+        return result
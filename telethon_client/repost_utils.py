@@ -1,13 +1,25 @@
 # repost_utils.py
 
+import os
+import json
 import asyncio
-from telethon.errors import ConnectionError as TLConnectionError
-from telethon_client.repost_utils_inline import save_inline_keyboard_post, get_post_data_by_id
-from telethon_client.session_manager import get_client
-from bot.ptb_post_utils import ptb_send_and_cleanup
-from telethon.tl.types import MessageService
+from telethon.errors import ConnectionError as TLConnectionError, FileReferenceExpiredError
+from telethon_client.repost_utils_inline import save_inline_keyboard_post, get_post_data_by_id, open_inline_media
+from telethon_client import media_cache, entity_cache
+from telethon_client.post_ref import KIND_GROUP, KIND_INLINE, KIND_SINGLE
+from telethon_client.session_manager import get_client, touch_client
+from telethon_client.rate_limiter import limited_call, client_account, AccountPausedError
+from bot.ptb_post_utils import ptb_send_post, cleanup_inline_post, extract_file_id
+from telethon.tl.types import MessageService, MessageMediaPhoto, MessageMediaDocument
+from telethon_client.storage import run_io, run_db
+from config import FANOUT_CONCURRENCY, INLINE_COPY_MODE, INLINE_MEDIA_FOLDER, COPY_CAPABILITY_FILE, BOT_API_UPLOAD_MAX_BYTES
 from bot.logger import logger
 
+# Akkaunt keyboard yubora oladimi (Telegram user akkaunt markupini odatda tashlab yuboradi): phone -> bool.
+# Restartlar orasida COPY_CAPABILITY_FILE da saqlanadi — tekshiruv har akkaunt uchun bir marta
+_copy_capability: dict[str, bool] | None = None
+_capability_probes: dict[str, asyncio.Task] = {}
+
 def is_forwardable(msg):
     if isinstance(msg, MessageService):
         return False
@@ -21,11 +33,14 @@ def is_forwardable(msg):
 
 async def _ensure_connected(client):
     """Telethon client ulanishini tekshirib, kerak bo'lsa qayta ulaydi."""
+    touch_client(client)
     if not client.is_connected():
         await client.connect()
     try:
-        # Sessiyani “uyg'otish” uchun engil chaqiriq
-        await client.get_me()
+        # Sessiyani “uyg'otish” uchun engil chaqiriq (akkaunt scheduleri orqali)
+        await limited_call(client_account(client), client.get_me, kind="read")
+    except AccountPausedError:
+        raise
     except Exception:
         # Agar sign-in holati buzilgan bo'lsa
         await client.start()
@@ -43,95 +58,305 @@ async def _with_reconnect(fn, retries=2, delay=2):
     raise last_err
 
 async def invite_link_to_chat_id(client, link: str):
-    if "t.me/+" in link or link.startswith("https://t.me/+") or link.startswith("t.me/+"):
-        entity = await client.get_entity(link)
-        if hasattr(entity, 'username') and entity.username:
-            return '@' + entity.username
-        return int('-100' + str(entity.id))
-    if "t.me/" in link:
-        username = link.split("/")[-1]
-        if username.startswith("+"):
-            entity = await client.get_entity(link)
-            if hasattr(entity, 'username') and entity.username:
-                return '@' + entity.username
-            return int('-100' + str(entity.id))
-        if username.startswith("@"):
-            return username
-        return "@" + username
-    if link.startswith("@"):
-        return link
+    """
+    Kanal linki/username ni yuborishda ishlatiladigan chat id ga aylantiradi.
+    Natija akkaunt bo‘yicha keshlanadi (entity_cache) — takroriy ishlarda tarmoqqa chiqilmaydi.
+    """
     if link.startswith("-100") and link[1:].isdigit():
         return int(link)
     if link.isdigit():
         return int(link)
-    return link
+    try:
+        return await entity_cache.resolve_peer_id(client, link)
+    except Exception as e:
+        # Username bo‘lsa eski yo‘l: Telethon uni yuborish paytida o‘zi resolve qiladi
+        if "t.me/+" in link or "joinchat/" in link:
+            raise
+        logger.warning(f"invite_link_to_chat_id: could not resolve {link}: {e}")
+        if "t.me/" in link:
+            username = link.split("/")[-1]
+            return username if username.startswith("@") else "@" + username
+        return link
+
+async def resolve_chat_ids(client, links: list[str]) -> list:
+    """Bir nechta link/username ni parallel resolve qiladi (tartib saqlanadi)."""
+    return list(await asyncio.gather(*(invite_link_to_chat_id(client, link) for link in links)))
 
 
+async def forward_post_ids(client, target_chat, ids, source_chat):
+    """Xabar(lar)ni idlari bo‘yicha muallifsiz forward qiladi — Message obyektlari kerak emas."""
+    await limited_call(client_account(client), lambda: _with_reconnect(lambda: client.forward_messages(
+        entity=target_chat,
+        messages=ids,
+        from_peer=source_chat,
+        drop_author=True
+    )), target=target_chat)
+
 async def send_media_group(client, target_chat, messages, source_chat):
     if not messages:
         logger.warning(f"[MEDIA GROUP] No messages to send to {target_chat}")
         return
     try:
-        await _ensure_connected(client)
         messages = sorted(messages, key=lambda m: m.id)
         logger.info(f"[MEDIA GROUP] Sending to {target_chat} → {[m.id for m in messages]}")
         for m in messages:
             logger.info(f"[MEDIA GROUP MSG] id={m.id} | date={m.date.isoformat()} | text={getattr(m, 'message', '')[:30]}")
-        await _with_reconnect(lambda: client.forward_messages(
-            entity=target_chat,
-            messages=[m.id for m in messages],
-            from_peer=source_chat,
-            drop_author=True
-        ))
+        await forward_post_ids(client, target_chat, [m.id for m in messages], source_chat)
         logger.info(f"[MEDIA GROUP] ✅ Forwarded to {target_chat}")
     except Exception as e:
         logger.error(f"send_media_group error (target={target_chat}): {e}", exc_info=True)
         raise  # muvofaqqiyatsizlikni yuqoriga ko'taramiz
 
-async def send_post_to_targets(client, target_ids, post, source_id):
-    msg = post.get("msg")
-    group_msgs = post.get("group_msgs", None)
+async def fan_out(target_ids, send_one, limit=FANOUT_CONCURRENCY) -> dict:
+    """
+    send_one(target_id) ni barcha targetlar uchun parallel (limit tagacha) bajaradi.
+    Bitta target xatosi qolganlarini to‘xtatmaydi. Natija: {target_id: True/False}.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(target_id):
+        async with semaphore:
+            try:
+                await send_one(target_id)
+                return target_id, True
+            except Exception as e:
+                logger.error(f"[FAN-OUT] target={target_id} failed: {e}", exc_info=True)
+                return target_id, False
+
+    results = await asyncio.gather(*(run(t) for t in target_ids))
+    return dict(results)
+
+async def send_inline_post_to_targets(post_data, target_ids, client, msg) -> dict:
+    """
+    Media bir marta Telethon dan oqim qilib olinadi va bir marta yuklanadi: birinchi muvaffaqiyatli
+    yuborishdan file_id olinadi va qolgan targetlarga media havola (file_id) orqali parallel yuboriladi.
+    """
+    results = {}
+    remaining = list(target_ids)
+    file_id = post_data.get("file_id")
 
+    # Bot API 50 MB dan kattasini qabul qilmaydi — media ni yuklab olishdan oldin targetlarni xato deb belgilaymiz
+    if post_data.get("media_name") and not file_id and (post_data.get("media_size") or 0) > BOT_API_UPLOAD_MAX_BYTES:
+        logger.error(
+            f"[INLINE] post {post_data['id']} media is {post_data['media_size']} bytes — over Bot API limit, "
+            f"not downloaded (only copy mode can send it)"
+        )
+        return {target_id: False for target_id in target_ids}
+
+    media_file = None
+    content_hash = None
+    try:
+        while remaining and post_data.get("media_name") and not file_id:
+            target_id = remaining.pop(0)
+            try:
+                if media_file is None:
+                    # Katta media qismlab shu yo‘lga yuklanadi (keyin keshga ko‘chadi); .part qoldiqlari
+                    # cleanup_inline_post da o‘chiriladi
+                    post_data["media_path"] = os.path.join(INLINE_MEDIA_FOLDER, post_data["media_name"])
+                    content_hash, media_file = await open_inline_media(client, msg, post_data["media_path"])
+                sent = await ptb_send_post(post_data, target_id, media_file=media_file)
+                results[target_id] = True
+                file_id = extract_file_id(sent)
+                if file_id:
+                    post_data["file_id"] = file_id
+                    logger.info(f"[INLINE] post {post_data['id']} uploaded once, file_id cached for remaining targets")
+            except Exception as e:
+                logger.error(f"[INLINE] upload to {target_id} failed: {e}", exc_info=True)
+                results[target_id] = False
+    finally:
+        if media_file is not None:
+            media_file.close()
+        if content_hash is not None:
+            await media_cache.release(content_hash)
+
+    if remaining:
+        results.update(await fan_out(
+            remaining,
+            lambda target_id: ptb_send_post(post_data, target_id, file_id=file_id)
+        ))
+    return results
+
+async def _copy_inline_post(client, target_id, msg):
+    """Postni media havolasi (msg.media) va asl keyboard bilan Telethon orqali qayta yuboradi."""
+    account = client_account(client)
+
+    async def send(source):
+        # Faqat photo/document havola orqali qayta yuboriladi (webpage preview media emas)
+        media = source.media if isinstance(source.media, (MessageMediaPhoto, MessageMediaDocument)) else None
+        return await client.send_message(
+            target_id,
+            source.message or "",
+            formatting_entities=source.entities,
+            file=media,
+            buttons=source.reply_markup,
+            link_preview=False,
+        )
+
+    try:
+        return await limited_call(account, lambda: _with_reconnect(lambda: send(msg)), target=target_id)
+    except FileReferenceExpiredError:
+        fresh = await limited_call(account, lambda: client.get_messages(msg.chat_id, ids=msg.id), kind="read")
+        return await limited_call(account, lambda: _with_reconnect(lambda: send(fresh)), target=target_id)
+
+def _load_copy_capability() -> dict[str, bool]:
+    global _copy_capability
+    if _copy_capability is None:
+        _copy_capability = {}
+        if os.path.exists(COPY_CAPABILITY_FILE):
+            try:
+                with open(COPY_CAPABILITY_FILE, "r") as f:
+                    _copy_capability = {k: bool(v) for k, v in json.load(f).items()}
+            except Exception as e:
+                logger.error(f"[COPY] capability file load error: {e}", exc_info=True)
+    return _copy_capability
+
+def _write_copy_capability(capability: dict[str, bool]):
+    try:
+        os.makedirs(os.path.dirname(COPY_CAPABILITY_FILE), exist_ok=True)
+        tmp_path = COPY_CAPABILITY_FILE + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(capability, f, indent=2)
+        os.replace(tmp_path, COPY_CAPABILITY_FILE)
+    except Exception as e:
+        logger.error(f"[COPY] capability file save error: {e}", exc_info=True)
+
+async def _set_copy_capability(account: str, supported: bool):
+    capability = await run_io(_load_copy_capability)
+    capability[account] = supported
+    if not account.startswith("client-"):  # pool tashqarisidagi client — saqlanmaydi
+        await run_db(_write_copy_capability, dict(capability))
+
+async def _probe_copy_capability(client, account: str, msg) -> bool:
+    """Keyboardni "Saved Messages" ga yuborib tekshiradi (kanal obunachilari hech narsa ko‘rmaydi) va o‘chiradi."""
+    sent = await limited_call(account, lambda: client.send_message("me", "⚙️ keyboard check", buttons=msg.reply_markup))
+    supported = bool(getattr(sent, "reply_markup", None))
+    try:
+        await limited_call(account, lambda: client.delete_messages("me", [sent.id]))
+    except Exception as e:
+        logger.error(f"[COPY] could not delete probe message for {account}: {e}", exc_info=True)
+    await _set_copy_capability(account, supported)
+    logger.info(f"[COPY] account {account} keyboard copy {'supported' if supported else 'unsupported'}")
+    return supported
+
+def copy_mode_known_supported(account: str) -> bool:
+    """Akkaunt copy rejimida ishlashi allaqachon tasdiqlangan (media baytlari umuman kerak emas)."""
+    return INLINE_COPY_MODE and bool((_copy_capability or {}).get(account))
+
+async def _copy_supported(client, account: str, msg) -> bool:
+    capability = await run_io(_load_copy_capability)
+    if account in capability:
+        return capability[account]
+    task = _capability_probes.get(account)
+    if task is None:
+        task = asyncio.ensure_future(_probe_copy_capability(client, account, msg))
+        _capability_probes[account] = task
+        task.add_done_callback(lambda _t: _capability_probes.pop(account, None))
+    try:
+        return await asyncio.shield(task)
+    except Exception as e:
+        logger.warning(f"[COPY] capability probe failed for {account}, using Bot API path: {e}")
+        return False
+
+async def copy_inline_post_to_targets(client, target_ids, msg) -> dict | None:
+    """
+    Copy rejimi: 0 bayt yuklab olinadi/yuklanadi, Bot API 50 MB limiti qo‘llanmaydi.
+    Akkaunt keyboard yubora olishi avval "Saved Messages" da tekshiriladi — olmasa None qaytaradi
+    (chaqiruvchi Bot API yo‘liga o‘tadi) va hech bir kanalga markupsiz xabar chiqmaydi.
+    """
+    account = client_account(client)
+    if not INLINE_COPY_MODE or not target_ids or not await _copy_supported(client, account, msg):
+        return None
+
+    first, rest = target_ids[0], list(target_ids[1:])
+    try:
+        sent = await _copy_inline_post(client, first, msg)
+    except Exception as e:
+        logger.warning(f"[COPY] msg_id={msg.id} → {first} failed, falling back to Bot API: {e}")
+        return None
+
+    if not getattr(sent, "reply_markup", None):
+        # Probe dan keyin ham markup tushib qolgan (kamdan-kam holat) — akkaunt endi Bot API yo‘lida
+        await _set_copy_capability(account, False)
+        logger.warning(f"[COPY] account {account} cannot send this keyboard — using Bot API path from now on")
+        try:
+            await limited_call(account, lambda: client.delete_messages(first, [sent.id]), target=first)
+        except Exception as e:
+            logger.error(f"[COPY] could not delete markup-less copy in {first}: {e}", exc_info=True)
+        return None
+
+    results = {first: True}
+    if rest:
+        results.update(await fan_out(rest, lambda target_id: _copy_inline_post(client, target_id, msg)))
+    logger.info(f"[COPY] msg_id={msg.id} copied by media reference → {results}")
+    return results
+
+async def release_inline_post(user_id: int, post_id: int):
+    """Inline post tugagach: store yozuvi va yuklab olish qoldiqlari (.part / .part.json) o‘chiriladi."""
+    post_data = await get_post_data_by_id(post_id, user_id)
+    if post_data:
+        await cleanup_inline_post(post_data)
+
+async def send_post_to_targets(client, target_ids, post, source_id, user_id: int, cleanup: bool = True) -> dict:
+    """
+    Postni (PostRef) barcha targetlarga yuboradi. Natija: {target_id: True/False} (har bir target alohida).
+    Forward uchun idlar yetarli; to‘liq Message faqat inline (yoki turi noma’lum) post uchun shu yerda olinadi.
+    cleanup=False — inline post store yozuvi va qisman yuklangan media qoldiriladi (post qayta navbatga
+    qo‘yilishi mumkin); chaqiruvchi post tugagach release_inline_post ni o‘zi chaqiradi.
+    """
     try:
         await _ensure_connected(client)
+        account = client_account(client)
 
-        if group_msgs:
-            logger.info(f"[SEND POST] Media group: msg_ids={[m.id for m in group_msgs]} → targets={target_ids}")
-            for target_id in target_ids:
-                await _ensure_connected(client)
-                await send_media_group(client, target_id, group_msgs, source_id)
+        msg = None
+        if post.kind in (None, KIND_INLINE):
+            msg = await limited_call(account, lambda: client.get_messages(source_id, ids=post.id), kind="read")
+            if msg is None:
+                logger.warning(f"[SEND POST] msg_id={post.id} not found in source")
+                return {target_id: False for target_id in target_ids}
+            if post.kind is None:
+                post.has_markup = bool(getattr(msg, "reply_markup", None))
+                post.kind = KIND_INLINE if post.has_markup else KIND_SINGLE
+
+        if post.kind == KIND_GROUP:
+            logger.info(f"[SEND POST] Media group: msg_ids={post.ids} → targets={target_ids}")
+            return await fan_out(
+                target_ids,
+                lambda target_id: forward_post_ids(client, target_id, post.ids, source_id)
+            )
 
-        elif getattr(msg, "reply_markup", None):
+        elif post.kind == KIND_INLINE:
             logger.info(f"[SEND POST] Inline msg_id={msg.id} → targets={target_ids}")
-            await save_inline_keyboard_post(msg, client)
-            post_data = get_post_data_by_id(msg.id)
-            if post_data:
-                for target_id in target_ids:
-                    await ptb_send_and_cleanup(post_data, target_id)
+            # Oldindan (prefetch) tayyorlangan bo‘lsa qayta yuklamaymiz
+            post_data = await get_post_data_by_id(msg.id, user_id) if post.staged else None
+            try:
+                copied = await copy_inline_post_to_targets(client, target_ids, msg)
+                if copied is not None:
+                    return copied
+                if not post_data:
+                    post_data = await save_inline_keyboard_post(msg, client, user_id, refresh=False)
+                if not post_data:
+                    return {target_id: False for target_id in target_ids}
+                return await send_inline_post_to_targets(post_data, target_ids, client, msg)
+            finally:
+                # Store yozuvi faqat barcha targetlar tugagach o‘chiriladi
+                if post_data and cleanup:
+                    await cleanup_inline_post(post_data)
 
         else:
-            logger.info(f"[SEND POST] Single msg_id={msg.id} | date={msg.date.isoformat()} → targets={target_ids}")
-            for target_id in target_ids:
-                await _ensure_connected(client)
-                await _with_reconnect(lambda: client.forward_messages(
-                    entity=target_id,
-                    messages=msg.id,
-                    from_peer=source_id,
-                    drop_author=True
-                ))
-
-        return True
+            logger.info(f"[SEND POST] Single msg_id={post.id} → targets={target_ids}")
+            return await fan_out(
+                target_ids,
+                lambda target_id: forward_post_ids(client, target_id, post.id, source_id)
+            )
     except Exception as e:
         logger.error(f"send_post_to_targets error: {e}", exc_info=True)
-        return False
+        return {target_id: False for target_id in target_ids}
 
 async def test_forward_posts(user_id: int, source: str, targets: list[str]):
     client = await get_client(user_id)
-    await client.start()
     posts_sent = 0
     try:
-        source_id = await invite_link_to_chat_id(client, source)
-        target_ids = [await invite_link_to_chat_id(client, t) for t in targets]
+        source_id, *target_ids = await resolve_chat_ids(client, [source, *targets])
 
         logger.info(f"[TEST INIT] source_id={source_id}, targets={target_ids}")
 
@@ -139,7 +364,10 @@ async def test_forward_posts(user_id: int, source: str, targets: list[str]):
         seen_group_ids = set()
         selected_items = []
 
-        async for message in client.iter_messages(source_id, limit=100):
+        recent = await limited_call(
+            client_account(client), lambda: client.get_messages(source_id, limit=100), kind="read"
+        )
+        for message in recent:
             if getattr(message, "reply_markup", None):
                 selected_items.append(("inline", message))
             elif message.grouped_id:
@@ -172,34 +400,34 @@ async def test_forward_posts(user_id: int, source: str, targets: list[str]):
                         logger.info(f"[TEST SEND] single msg_id={data.id} | date={data.date.isoformat()} → targets={target_ids}")
 
                     if item_type == "inline":
-                        await save_inline_keyboard_post(data, client)
-                        post_data = get_post_data_by_id(data.id)
+                        if await copy_inline_post_to_targets(client, [target_id], data) is not None:
+                            posts_sent += 1
+                            continue
+                        post_data = await save_inline_keyboard_post(data, client, user_id)
                         if post_data:
-                            await ptb_send_and_cleanup(post_data, target_id)
+                            try:
+                                result = await send_inline_post_to_targets(post_data, [target_id], client, data)
+                            finally:
+                                await cleanup_inline_post(post_data)
+                            if not result.get(target_id):
+                                raise RuntimeError(f"inline post {data.id} not sent")
                     elif item_type == "media":
                         group_messages = grouped_map.get(data, [])
                         if group_messages:
-                            await client.forward_messages(
-                                entity=target_id,
-                                messages=[m.id for m in sorted(group_messages, key=lambda x: x.id)],
-                                from_peer=source_id,
-                                drop_author=True
-                            )
+                            await send_media_group(client, target_id, group_messages, source_id)
                     elif item_type == "single":
-                        await client.forward_messages(
+                        await limited_call(client_account(client), lambda: client.forward_messages(
                             entity=target_id,
                             messages=data.id,
                             from_peer=source_id,
                             drop_author=True
-                        )
+                        ), target=target_id)
                     posts_sent += 1
-                    await asyncio.sleep(1)
                 except Exception as e:
                     logger.error(f"test_forward post error ({item_type}, target={target_id}): {e}", exc_info=True)
 
     except Exception as e:
         logger.error(f"User({user_id}) test_forward_posts fatal error: {e}", exc_info=True)
     finally:
-        await client.disconnect()
-        logger.info(f"User({user_id}) test_forward_posts finished/disconnected")
+        logger.info(f"User({user_id}) test_forward_posts finished")
     return posts_sent
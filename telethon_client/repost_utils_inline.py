@@ -1,188 +1,221 @@
 import os
-import json
+import tempfile
 from bot.logger import logger
+from telethon.errors import FileReferenceExpiredError
 from telethon.tl.types import DocumentAttributeVideo
-import asyncio
-from config import INLINE_JSON_PATH, INLINE_MEDIA_FOLDER
+from config import INLINE_JSON_PATH, INLINE_MEDIA_FOLDER, INLINE_MEMORY_MAX_BYTES
+from telethon_client import inline_store
+from telethon_client.rate_limiter import limited_call, client_account
+from telethon_client.storage import run_io
+from telethon_client.media_downloader import download_parallel, stream_download, remove_download
+from telethon_client import media_cache
+from bot.ptb_post_utils import parse_reply_markup
+
+def estimate_media_size(msg) -> int:
+    """Xabardagi media hajmini (bayt) taxminiy hisoblaydi — yuklab olmasdan."""
+    media = getattr(msg, "media", None)
+    if not media:
+        return 0
+    document = getattr(media, "document", None)
+    if document is not None:
+        return getattr(document, "size", 0) or 0
+    photo = getattr(media, "photo", None)
+    if photo is not None:
+        sizes = []
+        for size in getattr(photo, "sizes", []) or []:
+            if getattr(size, "size", None):
+                sizes.append(size.size)
+            elif getattr(size, "sizes", None):
+                sizes.append(max(size.sizes))
+        return max(sizes) if sizes else 0
+    return 0
+
+async def _refetch_message(client, msg):
+    # Reja paytida olingan xabarning file reference i eskirgan bo‘lishi mumkin — yangisini olamiz
+    return await limited_call(
+        client_account(client), lambda: client.get_messages(msg.chat_id, ids=msg.id), kind="read"
+    )
+
+def _is_large_document(msg) -> bool:
+    return getattr(msg.media, "document", None) is not None and estimate_media_size(msg) > INLINE_MEMORY_MAX_BYTES
+
+async def download_media_stream(client, msg):
+    """
+    Media ni diskka yozmasdan oladi: bo‘laklar (har biri alohida scheduler slotida) SpooledTemporaryFile ga yoziladi.
+    INLINE_MEMORY_MAX_BYTES gacha fayl to‘liq xotirada qoladi, kattasi vaqtinchalik faylga o‘tadi.
+    Boshiga qaytarilgan buffer ni qaytaradi (chaqiruvchi yopadi).
+    """
+    account = client_account(client)
+    buffer = tempfile.SpooledTemporaryFile(max_size=INLINE_MEMORY_MAX_BYTES)
+
+    async def fetch(source):
+        buffer.seek(0)
+        buffer.truncate()
+        async for chunk in stream_download(client, source.media, account):
+            if buffer.tell() + len(chunk) > INLINE_MEMORY_MAX_BYTES:
+                await run_io(buffer.write, chunk)  # diskka o‘tgan buffer — yozish thread poolda
+            else:
+                buffer.write(chunk)
 
+    try:
+        try:
+            await fetch(msg)
+        except FileReferenceExpiredError:
+            msg = await _refetch_message(client, msg)
+            await fetch(msg)
+        size = buffer.tell()
+        buffer.seek(0)
+        logger.info(f"Media streamed: msg_id={msg.id}, {size} bytes")
+        return buffer
+    except Exception:
+        buffer.close()
+        raise
+
+async def _download_large_document(client, msg, dest_path):
+    """Katta document ni media_downloader orqali qismlab, parallel va davom ettiriladigan tarzda yuklaydi."""
+    size = estimate_media_size(msg)
+    label = f"msg_id={msg.id}"
+    try:
+        await download_parallel(client, msg.media, dest_path, size, label=label)
+    except FileReferenceExpiredError:
+        msg = await _refetch_message(client, msg)
+        await download_parallel(client, msg.media, dest_path, size, label=label)
 
-async def wait_for_complete_file(file_path, max_wait=3, check_interval=0.1):
+async def open_inline_media(client, msg, dest_path):
     """
-    Fayl to‘liq yozilishini kutadi. Fayl hajmi o‘zgarmay qolgunga qadar kutadi.
-    max_wait: maksimal kutish vaqti (sekund)
-    check_interval: tekshirish oralig‘i (sekund)
+    Inline post media sini yuborish uchun ochadi: (content_hash, fayl obyekti).
+    Avval kontent-manzilli keshdan (media_cache) qidiriladi; topilmasa yuklab olinib keshga qo‘shiladi —
+    bir xil media boshqa user/ishlarda qayta yuklanmaydi. Tugagach media_cache.release(hash) chaqiring.
     """
-    waited = 0
-    last_size = -1
-    while waited < max_wait:
-        if not os.path.exists(file_path):
-            await asyncio.sleep(check_interval)
-            waited += check_interval
-            continue
-        current_size = os.path.getsize(file_path)
-        if current_size > 0 and current_size == last_size:
-            return True  # Fayl to‘liq
-        last_size = current_size
-        await asyncio.sleep(check_interval)
-        waited += check_interval
-    return False
-
-async def save_inline_keyboard_post(msg, client):
+    key = media_cache.media_key(msg)
+    hit = await media_cache.acquire(key)
+    if hit is None:
+        if _is_large_document(msg):
+            await _download_large_document(client, msg, dest_path)
+            hit = await media_cache.store(key, path=dest_path)
+        else:
+            buffer = await download_media_stream(client, msg)
+            try:
+                hit = await media_cache.store(key, fileobj=buffer)
+            finally:
+                buffer.close()
+    content_hash, path = hit
+    try:
+        return content_hash, await run_io(open, path, "rb")
+    except Exception:
+        await media_cache.release(content_hash)
+        raise
+
+async def prefetch_inline_media(client, msg, media_name: str):
     """
-    Keyboardli postni json faylga (har doim update!), media bo‘lsa - faylga saqlaydi.
+    Look-ahead: media ni yuborish vaqtidan oldin media_cache ga yuklab qo‘yadi (yuborishda kesh hit bo‘ladi).
+    Allaqachon keshda bo‘lsa hech narsa yuklanmaydi.
     """
+    content_hash, media_file = await open_inline_media(client, msg, os.path.join(INLINE_MEDIA_FOLDER, media_name))
+    media_file.close()
+    await media_cache.release(content_hash)
 
-    try:
-        msg = await client.get_messages(msg.chat_id, ids=msg.id)
-    except Exception as e:
-        logger.error(f"msg qayta olishda xatolik: {e}", exc_info=True)
-        return
-
-    if not getattr(msg, "reply_markup", None):
-        return
+async def save_inline_keyboard_post(msg, client, user_id: int, refresh: bool = True):
+    """
+    Keyboardli postni inline_store ga (user, post id) bo‘yicha (har doim update!) saqlaydi.
+    Media yuklab olinmaydi — faqat yuborish uchun kerakli ma'lumot (nom, hajm) yoziladi,
+    baytlar yuborish vaqtida open_inline_media orqali olinadi.
+    refresh=False — chaqiruvchi xabarni o‘zi yangilagan (masalan, kun bo‘yicha bitta get_messages).
+    Saqlangan post_data ni qaytaradi.
+    """
 
-    # Papka borligini tekshir
-    if not os.path.exists(INLINE_MEDIA_FOLDER):
+    if refresh:
         try:
-            os.makedirs(INLINE_MEDIA_FOLDER)
-            logger.info(f"INLINE_MEDIA_FOLDER created: {INLINE_MEDIA_FOLDER}")
+            msg = await _refetch_message(client, msg)
         except Exception as e:
-            logger.error(f"Cannot create INLINE_MEDIA_FOLDER: {e}", exc_info=True)
+            logger.error(f"msg qayta olishda xatolik: {e}", exc_info=True)
             return
 
-    # Eski json'ni o‘qib olamiz
-    if os.path.exists(INLINE_JSON_PATH):
-        try:
-            with open(INLINE_JSON_PATH, "r", encoding="utf-8") as f:
-                content = f.read().strip()
-                data = json.loads(content) if content else []
-        except Exception as e:
-            logger.error(f"Error reading {INLINE_JSON_PATH}: {e}", exc_info=True)
-            data = []
-    else:
-        data = []
+    if not getattr(msg, "reply_markup", None):
+        return
+
+    # Keyboard bir marta PTB formatiga o‘tkaziladi — har bir target yuborishda qayta parse qilinmaydi
+    raw_markup = msg.reply_markup.to_dict() if hasattr(msg.reply_markup, "to_dict") else str(msg.reply_markup)
+    keyboard = parse_reply_markup(raw_markup)
 
     # Default post_data
     post_data = {
         "id": msg.id,
+        "user_id": user_id,
         "date": msg.date.isoformat(),
         "text": msg.raw_text or msg.message or "",
         "media_type": str(type(msg.media)).split("'")[1] if msg.media else None,
-        "media_path": None,
-        "reply_markup": msg.reply_markup.to_dict() if hasattr(msg.reply_markup, "to_dict") else str(msg.reply_markup),
+        "media_name": None,
+        "media_size": 0,
+        "reply_markup": keyboard.to_dict() if keyboard else raw_markup,
         "is_round_video": False  # ✅ Default False
     }
 
-    # MEDIA bo‘lsa yuklab olamiz
+    # MEDIA bo‘lsa — fayl nomi (kengaytma Bot API metodini tanlaydi) va hajmi
     if msg.media:
         extension = None
-        filename = None
-        try:
-            if hasattr(msg.media, "photo") and msg.media.photo:
-                try:
-                    # Faylni papkaga, avtomatik nom bilan saqlaymiz
-                    downloaded_path = await client.download_media(msg, file=INLINE_MEDIA_FOLDER)
-                    complete = await wait_for_complete_file(downloaded_path)
-                    if not complete:
-                        logger.error(f"Photo fayl to‘liq emas yoki hali yozilmoqda: {downloaded_path}")
-                        return
-                    else:
-                        logger.info(f"Photo downloaded: {downloaded_path}")
-                        post_data["media_path"] = downloaded_path
-                except Exception as e:
-                    logger.error(f"Photo download error: {e}", exc_info=True)
-                    return
-
-            elif hasattr(msg.media, "document") and msg.media.document:
-                mime = getattr(msg.media.document, "mime_type", "")
-                if not mime:
-                    logger.warning(f"mime_type yo‘q, media SKIP qilindi: msg_id={msg.id}")
-                    return
-                if "video" in mime:
-                    extension = "mp4"
-                elif "image" in mime:
-                    extension = "jpg"
-                elif "pdf" in mime:
-                    extension = "pdf"
-                elif "gif" in mime:
-                    extension = "gif"
-                else:
-                    logger.warning(f"Noma’lum mime_type ({mime}), media SKIP qilindi: msg_id={msg.id}")
-                    return
-                try:
-                    for attr in msg.media.document.attributes:
-                        if isinstance(attr, DocumentAttributeVideo) and getattr(attr, "round_message", False):
-                            post_data["is_round_video"] = True
-                except Exception as e:
-                    logger.error(f"Round video aniqlashda xatolik: {e}")
-                if extension:
-                    filename = f"{msg.id}.{extension}"
-                    file_path = os.path.join(INLINE_MEDIA_FOLDER, filename)
-                    if not os.path.exists(file_path):
-                        await client.download_media(msg, file_path)
-                        logger.info(f"Media downloaded: {file_path}")
-                    post_data["media_path"] = file_path
+        if hasattr(msg.media, "photo") and msg.media.photo:
+            extension = "jpg"
+        elif hasattr(msg.media, "document") and msg.media.document:
+            mime = getattr(msg.media.document, "mime_type", "")
+            if not mime:
+                logger.warning(f"mime_type yo‘q, media SKIP qilindi: msg_id={msg.id}")
+                return
+            if "video" in mime:
+                extension = "mp4"
+            elif "image" in mime:
+                extension = "jpg"
+            elif "pdf" in mime:
+                extension = "pdf"
+            elif "gif" in mime:
+                extension = "gif"
+            else:
+                logger.warning(f"Noma’lum mime_type ({mime}), media SKIP qilindi: msg_id={msg.id}")
+                return
+            try:
+                for attr in msg.media.document.attributes:
+                    if isinstance(attr, DocumentAttributeVideo) and getattr(attr, "round_message", False):
+                        post_data["is_round_video"] = True
+            except Exception as e:
+                logger.error(f"Round video aniqlashda xatolik: {e}")
+        if extension:
+            post_data["media_name"] = f"{user_id}_{msg.id}.{extension}"
+            post_data["media_size"] = estimate_media_size(msg)
 
-        except Exception as e:
-            logger.error(f"Media yuklashda xatolik: {e}", exc_info=True)
-            post_data["media_path"] = None
-
-
-    # Ma'lumotlarni update qilamiz: id bo‘yicha eski postni yangilaymiz yoki yangi post qo‘shamiz
-    updated = False
-    for idx, x in enumerate(data):
-        if x["id"] == post_data["id"]:
-            data[idx] = post_data  # eski postni yangilaymiz
-            updated = True
-            logger.info(f"Inline post updated: {post_data['id']}")
-            break
-    if not updated:
-        data.append(post_data)  # yangi post
-        logger.info(f"Inline post added: {post_data['id']}")
-
-    # Faylga yozamiz
+
+    # (user, post id) bo‘yicha upsert
     try:
-        with open(INLINE_JSON_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-        logger.info(f"INLINE_JSON_PATH updated ({INLINE_JSON_PATH})")
+        await inline_store.upsert_post(user_id, post_data)
     except Exception as e:
-        logger.error(f"INLINE_JSON_PATH write error: {e}", exc_info=True)
+        logger.error(f"inline_store write error: {e}", exc_info=True)
+        return None
+    return post_data
 
-def get_post_data_by_id(post_id):
-    if os.path.exists(INLINE_JSON_PATH):
-        try:
-            with open(INLINE_JSON_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            for post in data:
-                if post.get("id") == post_id:
-                    return post
-        except Exception as e:
-            logger.error(f"get_post_data_by_id error: {e}", exc_info=True)
+async def get_post_data_by_id(post_id, user_id):
+    try:
+        return await inline_store.get_post(user_id, post_id)
+    except Exception as e:
+        logger.error(f"get_post_data_by_id error: {e}", exc_info=True)
     return None
 
 
-def cleanup_inline_posts_and_media():
-    # Inline post JSON va media papkasini tozalaydi
-    # JSON faylini tozalash
+def _remove_media_files(paths):
+    for media_path in paths:
+        if media_path:
+            try:
+                if remove_download(media_path):
+                    logger.info(f"Cleanup: media file removed: {media_path}")
+            except Exception as e:
+                logger.error(f"Cleanup: could not remove media {media_path}: {e}", exc_info=True)
+
+def _remove_legacy_inline_files():
+    # Eski (JSON) formatdagi fayl qolgan bo‘lsa o‘chiramiz
     if os.path.exists(INLINE_JSON_PATH):
         try:
-            with open(INLINE_JSON_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            # Medialarni o‘chirish
-            for post in data:
-                media_path = post.get("media_path")
-                if media_path and os.path.exists(media_path):
-                    try:
-                        os.remove(media_path)
-                        logger.info(f"Cleanup: media file removed: {media_path}")
-                    except Exception as e:
-                        logger.error(f"Cleanup: could not remove media {media_path}: {e}", exc_info=True)
-            # JSON faylni bo‘sh qilib yozish
-            with open(INLINE_JSON_PATH, "w", encoding="utf-8") as f:
-                json.dump([], f)
-            logger.info("Cleanup: INLINE_JSON_PATH cleared")
+            os.remove(INLINE_JSON_PATH)
+            logger.info("Cleanup: legacy INLINE_JSON_PATH removed")
         except Exception as e:
-            logger.error(f"Cleanup error in JSON: {e}", exc_info=True)
+            logger.error(f"Cleanup: could not remove {INLINE_JSON_PATH}: {e}", exc_info=True)
     # Media papkasida eski media qolgan bo‘lsa (sug‘urib olingan), hammasini tozalash
     if os.path.exists(INLINE_MEDIA_FOLDER):
         for fname in os.listdir(INLINE_MEDIA_FOLDER):
@@ -191,4 +224,17 @@ def cleanup_inline_posts_and_media():
                 os.remove(fpath)
                 logger.info(f"Cleanup: orphan media removed: {fpath}")
             except Exception as e:
-                logger.error(f"Cleanup: could not remove orphan media {fpath}: {e}", exc_info=True)
\ No newline at end of file
+                logger.error(f"Cleanup: could not remove orphan media {fpath}: {e}", exc_info=True)
+
+async def cleanup_inline_posts_and_media(user_id=None):
+    # Inline postlar (store) va ularning medialarini tozalaydi; user_id berilmasa — hammasini
+    try:
+        posts = await inline_store.list_posts(user_id)
+        await run_io(_remove_media_files, [post.get("media_path") for post in posts])
+        await inline_store.clear_posts(user_id)
+        logger.info("Cleanup: inline post store cleared")
+    except Exception as e:
+        logger.error(f"Cleanup error in inline store: {e}", exc_info=True)
+    if user_id is not None:
+        return
+    await run_io(_remove_legacy_inline_files)
@@ -1,184 +1,521 @@
-import asyncio
+import time as _time
 from datetime import datetime, timedelta, timezone, time
 from collections import defaultdict
-from telethon_client.repost_utils import send_post_to_targets
+from telethon.errors import ServerError, TimedOutError
+from telethon_client.repost_utils import send_post_to_targets, release_inline_post, _ensure_connected
 from telethon_client.session_manager import get_client
-from telethon_client.repost_utils import invite_link_to_chat_id
+from telethon_client.rate_limiter import limited_call, client_account, paused_for, AccountPausedError
+from telethon_client.repost_utils import resolve_chat_ids, copy_mode_known_supported
+from telethon_client.dispatcher import schedule_at, cancel_key
+from telethon_client import job_store
+from telethon_client.repost_utils_inline import save_inline_keyboard_post, prefetch_inline_media
 from telethon_client.channel_store import get_channels
+from telethon_client.post_ref import PostRef, KIND_GROUP, KIND_INLINE, message_ts
+from config import PREFETCH_MAX_BYTES, BOT_API_UPLOAD_MAX_BYTES, JOB_RETRY_BASE_DELAY, JOB_RETRY_MAX_DELAY
 from bot.logger import logger
 
-async def scheduled_repost_by_days(
-    user_id,
-    source,
-    targets,
-    time_range,
-    context=None,
-):
+def _is_valid_archive_msg(m) -> bool:
+    if not hasattr(m, "id"):
+        return False
+    if getattr(m, "empty", False):
+        return False
+    return bool(getattr(m, "text", None) or getattr(m, "message", None) or getattr(m, "raw_text", None) or getattr(m, "media", None))
+
+def _build_day_posts(media_groups, single_posts):
+    """Bir kunlik postlardan (albom + oddiy) vaqt bo‘yicha tartiblangan PostRef ro‘yxatini tuzadi."""
+    posts_to_send = [PostRef.from_group(members) for members in media_groups.values()]
+    posts_to_send.extend(single_posts)
+    return sorted(posts_to_send, key=lambda post: (post.ts, post.id))
+
+# History bitta GetHistory so‘rovida shuncha xabar qaytaradi
+_HISTORY_PAGE = 100
+
+async def _iter_history(client, source_id, offset_date):
+    """
+    client.iter_messages(reverse=True, offset_date=...) ning sahifalab varianti: har bir sahifa
+    alohida limited_call (akkaunt scheduleri slotida) olinadi — uzun skan slotni band qilib turmaydi.
+    """
+    account = client_account(client)
+    page_kwargs = {"offset_date": offset_date}
+    while True:
+        page = await limited_call(
+            account,
+            lambda: client.get_messages(source_id, limit=_HISTORY_PAGE, reverse=True, **page_kwargs),
+            kind="read"
+        )
+        if not page:
+            return
+        for m in page:
+            yield m
+        page_kwargs = {"offset_id": page[-1].id}
+
+async def iter_archive_days(client, source_id, start_date, end_date):
+    """
+    Arxivni start_date dan boshlab BITTA oldinga (reverse=True) oqim bilan o‘qiydi va xabarlarni kunlarga ajratadi.
+    Har bir kun (bo‘sh kunlar ham) to‘liq yig‘ilgach (day, posts_to_send) ko‘rinishida yield qilinadi.
+    History so‘rovlari kunlar soniga emas, xabarlar soniga bog‘liq. Xabarlar darhol ixcham PostRef ga
+    aylantiriladi — kun davomida to‘liq Message obyektlari xotirada turmaydi.
+    """
+    range_start = datetime.combine(start_date, time(0, 0), tzinfo=timezone.utc)
+    range_end = datetime.combine(end_date + timedelta(days=1), time(0, 0), tzinfo=timezone.utc)
+
+    current_day = start_date
+    media_groups = defaultdict(list)
+    single_posts = []
+
+    async for m in _iter_history(client, source_id, range_start):
+        if not _is_valid_archive_msg(m):
+            continue
+
+        msg_dt = m.date.astimezone(timezone.utc)
+        if msg_dt < range_start:
+            continue
+        if msg_dt >= range_end:
+            break  # Oraliq tugadi
+
+        # Yangi kunga o‘tdik — oldingi kun(lar) tayyor
+        while msg_dt.date() > current_day:
+            yield current_day, _build_day_posts(media_groups, single_posts)
+            media_groups = defaultdict(list)
+            single_posts = []
+            current_day += timedelta(days=1)
+
+        group_id = getattr(m, "grouped_id", None)
+        if group_id:
+            media_groups[group_id].append((m.id, message_ts(m)))
+        else:
+            single_posts.append(PostRef.from_message(m))
+
+    # Qolgan kunlar (oxirgi to‘plangan kun va keyingi bo‘sh kunlar)
+    while current_day <= end_date:
+        yield current_day, _build_day_posts(media_groups, single_posts)
+        media_groups = defaultdict(list)
+        single_posts = []
+        current_day += timedelta(days=1)
+
+async def stage_day_posts(client, user_id, source_id, posts_to_send, budget=PREFETCH_MAX_BYTES):
+    """
+    Kun postlarini yuborishdan oldin tayyorlaydi: inline postlar store ga saqlanadi.
+    Kunning barcha inline postlari bitta get_messages(ids=[...]) bilan olinadi; Message lar
+    saqlangach tashlab yuboriladi. Media budget doirasida media_cache ga oldindan yuklanadi —
+    yuborish vaqtida yuklab olish kutilmaydi; budget dan oshganlari yuborish vaqtida olinadi.
+    Natija: (staged postlar soni, oldindan yuklangan baytlar).
     """
-    Har kuni faqat bitta arxiv kun postlarini yig‘adi va real kunda, to‘g‘ri vaqt bilan targetlarga forward qiladi.
-    Media group (albom), oddiy post, inline, sortirovka va bekor qilish nazorati bor!
+    inline_posts = [post for post in posts_to_send if post.kind == KIND_INLINE]
+    if not inline_posts:
+        return 0, 0
+
+    account = client_account(client)
+    ids = [post.id for post in inline_posts]
+    try:
+        fresh = await limited_call(account, lambda: client.get_messages(source_id, ids=ids), kind="read")
+    except Exception as e:
+        logger.error(f"User({user_id}) staging refresh error: {e}", exc_info=True)
+        return 0, 0
+    by_id = {m.id: m for m in fresh if m is not None}
+
+    staged = 0
+    used = 0
+    for post in inline_posts:
+        msg = by_id.get(post.id)
+        if msg is None:
+            logger.warning(f"User({user_id}) staging: post {post.id} not found on refresh, staged at send time")
+            continue
+        try:
+            post_data = await save_inline_keyboard_post(msg, client, user_id, refresh=False)
+            if not post_data:
+                continue
+            post.staged = True
+            staged += 1
+
+            # Copy rejimi media baytlarisiz ishlaydi; Bot API limitidan kattasi baribir yuborilmaydi
+            size = post_data.get("media_size") or 0
+            if not post_data.get("media_name") or copy_mode_known_supported(account) or size > BOT_API_UPLOAD_MAX_BYTES:
+                continue
+            if used + size > budget:
+                logger.info(f"User({user_id}) prefetch budget reached, post {msg.id} media will be fetched at send time")
+                continue
+            await prefetch_inline_media(client, msg, post_data["media_name"])
+            used += size
+        except Exception as e:
+            logger.error(f"User({user_id}) staging error (post {msg.id}): {e}", exc_info=True)
+    return staged, used
+
+def _post_time(post):
+    """Post asl vaqtining kun ichidagi vaqti (UTC) — rejadagi kunga shu vaqtda qo‘yiladi."""
+    return datetime.fromtimestamp(post.ts, timezone.utc).time()
+
+# Faol repost ishlari: user_id -> job (holat lug‘ati). Har bir ish uchun alohida coroutine yo‘q —
+# barcha vazifalar markaziy dispatcher taymerida turadi.
+_jobs: dict[int, dict] = {}
+
+def is_job_running(user_id) -> bool:
+    return user_id in _jobs
+
+def _plan_key(user_id):
+    return (user_id, "plan")
+
+def _send_key(user_id):
+    return (user_id, "send")
+
+async def _notify(job, text):
+    bot = job.get("bot")
+    if not bot:
+        return
+    try:
+        await bot.send_message(chat_id=job["user_id"], text=text)
+    except Exception as e:
+        logger.error(f"User({job['user_id']}) notify error: {e}", exc_info=True)
+
+async def start_repost_job(user_id, source, targets, time_range, bot=None):
+    """
+    Repost ishini markaziy dispatcherga qo‘shadi. Har kuni faqat bitta arxiv kun postlari rejalashtiriladi
+    va real kunda, to‘g‘ri vaqt bilan targetlarga forward qilinadi.
     """
     user_data = get_channels(user_id)
     utc_offset = int(time_range.get("utc_offset", 0)) or int(user_data.get("time", {}).get("utc_offset", 0))
-    offset_delta = timedelta(hours=utc_offset)
 
-    client = await get_client(user_id)
-    await client.start()
+    job = {
+        "user_id": user_id,
+        "source": source,
+        "targets": targets,
+        "time_range": time_range,
+        "bot": bot,
+        "utc_offset": utc_offset,
+        "idx": 0,
+        "days_pending": 0,
+        "exhausted": False,
+    }
+    _jobs[user_id] = job
+    await job_store.save_job(job)
+    schedule_at(_time.time(), _plan_key(user_id), _job_setup)
+    return job
 
-    source_id = await invite_link_to_chat_id(client, source)
-    target_ids = [await invite_link_to_chat_id(client, t) for t in targets]
+async def restore_repost_jobs(bot=None) -> int:
+    """Bot qayta ishga tushganda diskdagi ishlarni tiklaydi: oxirgi checkpointdan davom etadi."""
+    restored = 0
+    for saved in await job_store.load_jobs():
+        user_id = saved["user_id"]
+        if user_id in _jobs:
+            continue
+        job = {
+            "user_id": user_id,
+            "source": saved["source"],
+            "targets": saved["targets"],
+            "time_range": saved["time_range"],
+            "bot": bot,
+            "utc_offset": saved["utc_offset"],
+            "idx": saved["idx"],
+            "days_pending": 0,
+            "exhausted": saved["exhausted"],
+            "restored": saved,
+        }
+        _jobs[user_id] = job
+        schedule_at(_time.time(), _plan_key(user_id), _job_setup)
+        restored += 1
+        logger.info(f"User({user_id}) repost job restored: {len(saved['posts'])} planned posts pending")
+    return restored
 
-    # Sana oraliqlari
-    start_date = datetime.strptime(time_range["start"], "%Y-%m-%d %H:%M").date()
-    end_date = datetime.strptime(time_range["end"], "%Y-%m-%d %H:%M").date()
+async def cancel_repost_job(user_id) -> bool:
+    job = _jobs.pop(user_id, None)
+    if job is None:
+        return False
+    cancel_key(_plan_key(user_id))
+    cancel_key(_send_key(user_id))
+    await job_store.delete_job(user_id)
+    day_iter = job.get("day_iter")
+    if day_iter is not None:
+        try:
+            await day_iter.aclose()
+        except Exception:
+            pass  # generator hozir ishlayotgan bo‘lishi mumkin — GC yopadi
+    logger.warning(f"User({user_id}) repost bekor qilindi.")
+    await _notify(job, "⏹️ Репост отменён.")
+    await _notify(job, "✅ Репост завершён!")
+    return True
 
-    logger.info(f"User({user_id}) optimized daily repost started: {source} → {targets}, {start_date}–{end_date}, UTC+{utc_offset}")
+async def _finish_job(job, error=None):
+    user_id = job["user_id"]
+    if _jobs.get(user_id) is not job:
+        return
+    _jobs.pop(user_id, None)
+    cancel_key(_plan_key(user_id))
+    cancel_key(_send_key(user_id))
+    await job_store.delete_job(user_id)
+    if error is not None:
+        logger.error(f"User({user_id}) repostda xatolik: {error}", exc_info=error)
+        await _notify(job, "❌ Ошибка в репосте!")
+    else:
+        logger.info(f"User({user_id}) all repost days finished")
+        await _notify(job, "🎉 Репосты за все дни завершены!")
+    await _notify(job, "✅ Репост завершён!")
 
-    today = datetime.now(timezone.utc).date()
-    start_repost_date = today + timedelta(days=1)
+# Ishni tugatmaydigan xatolar: tarmoq uzilishi (ConnectionError ham OSError), timeout, Telegram server xatosi
+_TRANSIENT_ERRORS = (OSError, TimeoutError, ServerError, TimedOutError)
 
-    current_day = start_date
-    idx = 0
+async def _job_error(job, key, handler, error):
+    """
+    Sozlash/rejalash xatosi: vaqtinchalik bo‘lsa ish (va diskdagi yozuvi) saqlanadi, shu kalit
+    eksponensial kutishdan keyin qayta ishga tushiriladi. Boshqa xatolar (source/target noto‘g‘ri,
+    avtorizatsiya bekor qilingan) ishni tugatadi.
+    """
+    if isinstance(error, AccountPausedError):
+        # FloodWait: akkaunt pauzada — ish tugatilmaydi, pauzadan keyin shu bosqich qayta bajariladi (_job_send kabi)
+        schedule_at(_time.time() + error.seconds, key, handler)
+        logger.warning(f"User({job['user_id']}) {handler.__name__} re-queued in {int(error.seconds)}s (FloodWait)")
+        return
+    if not isinstance(error, _TRANSIENT_ERRORS):
+        await _finish_job(job, error)
+        return
+    attempt = job.get("retry_attempt", 0)
+    job["retry_attempt"] = attempt + 1
+    delay = min(JOB_RETRY_MAX_DELAY, JOB_RETRY_BASE_DELAY * 2 ** attempt)
+    logger.warning(f"User({job['user_id']}) {handler.__name__} transient error, retry in {delay}s: {error}")
+    schedule_at(_time.time() + delay, key, handler)
 
+async def _job_setup(key, _payload):
+    user_id = key[0]
+    job = _jobs.get(user_id)
+    if job is None:
+        return
     try:
-        while current_day <= end_date:
-            planned_date = start_repost_date + timedelta(days=idx)
-            day_start = datetime.combine(current_day, time(0, 0), tzinfo=timezone.utc)
-            day_end = datetime.combine(current_day, time(23, 59), tzinfo=timezone.utc)
-            media_groups = defaultdict(list)
-            single_msgs = []
-
-            logger.info(f"User({user_id}) checking posts for {current_day}")
-
-            # Faqat shu kun uchun postlarni Telegramdan so‘raymiz (offset_date=day_end, reverse=False)
-            async for m in client.iter_messages(source_id, reverse=False, offset_date=day_end):
-                if not hasattr(m, "id"): continue
-                if getattr(m, "empty", False): continue
-                if not (getattr(m, "text", None) or getattr(m, "message", None) or getattr(m, "raw_text", None) or getattr(m, "media", None)): continue
-
-                msg_dt = m.date.astimezone(timezone.utc)
-                logger.info(f"[DEBUG] id={m.id} | msg_dt={msg_dt.isoformat()} | day_start={day_start} | day_end={day_end}")
-
-                if msg_dt < day_start:
-                    break  # Endi shu kundan oldingi post - bu kun tugadi
-
-                group_id = getattr(m, "grouped_id", None)
-                if group_id:
-                    media_groups[group_id].append(m)
-                else:
-                    single_msgs.append(m)
-
-            # Yig‘ilgan postlarni to‘g‘ri ketma-ketlikda tuzamiz
-            posts_to_send = []
-
-            for group_msgs in media_groups.values():
-                group_msgs = sorted(group_msgs, key=lambda m: m.id)
-                first_msg = group_msgs[0]
-                msg_time_utc = first_msg.date.replace(tzinfo=timezone.utc)
-                posts_to_send.append({
-                    "msg": first_msg,
-                    "group_msgs": group_msgs,
-                    "msg_time_utc": msg_time_utc,
-                })
-
-            for m in single_msgs:
-                msg_time_utc = m.date.replace(tzinfo=timezone.utc)
-                posts_to_send.append({
-                    "msg": m,
-                    "msg_time_utc": msg_time_utc,
-                })
-
-            posts_to_send = sorted(posts_to_send, key=lambda x: x["msg_time_utc"])
+        client = await get_client(user_id)
+        # Source va barcha targetlar bir vaqtda (keshdan yoki parallel so‘rovlar bilan) resolve qilinadi
+        job["source_id"], *job["target_ids"] = await resolve_chat_ids(client, [job["source"], *job["targets"]])
+
+        # Sana oraliqlari
+        time_range = job["time_range"]
+        start_date = datetime.strptime(time_range["start"], "%Y-%m-%d %H:%M").date()
+        end_date = datetime.strptime(time_range["end"], "%Y-%m-%d %H:%M").date()
+
+        # Xato bo‘lsa qayta urinishda ham kerak — faqat muvaffaqiyatdan keyin olib tashlanadi
+        restored = job.get("restored")
+        if restored and restored["start_repost_date"]:
+            job["start_repost_date"] = datetime.strptime(restored["start_repost_date"], "%Y-%m-%d").date()
+        else:
+            job["start_repost_date"] = datetime.now(timezone.utc).date() + timedelta(days=1)
+            await job_store.update_job(user_id, start_repost_date=job["start_repost_date"].isoformat())
+        # Allaqachon rejalashtirilgan kunlar qayta skan qilinmaydi
+        if restored and restored["next_archive_day"]:
+            start_date = datetime.strptime(restored["next_archive_day"], "%Y-%m-%d").date()
+        job["archive_range"] = (start_date, end_date)
+        job["day_iter"] = None  # _job_plan da archive_range dan yaratiladi
+
+        logger.info(f"User({user_id}) optimized daily repost started: {job['source']} → {job['targets']}, {start_date}–{end_date}, UTC+{job['utc_offset']}")
+
+        if restored:
+            await _restore_planned_posts(job, restored)
+    except Exception as e:
+        await _job_error(job, key, _job_setup, e)
+        return
+    job.pop("restored", None)
+    job["retry_attempt"] = 0
+
+    if restored and restored["open_days"]:
+        # Ochiq kun boshlanganda keyingi kun rejalashtiriladi (look-ahead)
+        last_open = datetime.strptime(restored["open_days"][-1], "%Y-%m-%d").date()
+        day_start_ts = datetime.combine(last_open, time(0, 0), tzinfo=timezone.utc).timestamp()
+        if not job["exhausted"]:
+            schedule_at(max(_time.time(), day_start_ts), _plan_key(user_id), _job_plan)
+        return
+    if job["exhausted"]:
+        await _finish_job(job)
+        return
+    await _job_plan(key, None)
 
+async def _restore_planned_posts(job, restored):
+    """Diskdagi rejadan yuborilmagan postlarni qayta taymerga qo‘yadi (history qayta skan qilinmaydi)."""
+    user_id = job["user_id"]
+    send_key = _send_key(user_id)
+    planned = restored["posts"]
+
+    last_due = {}
+    for p in planned:
+        # Turi noma’lum — xabar faqat yuborish vaqtida olinadi (tiklashda history so‘ralmaydi)
+        group_ids = tuple(p["group_ids"]) if p["group_ids"] else None
+        post = PostRef(p["post_id"], p["due_ts"], KIND_GROUP if group_ids else None, group_ids=group_ids)
+        schedule_at(p["due_ts"], send_key, _job_send, post)
+        last_due[p["planned_date"]] = max(last_due.get(p["planned_date"], 0), p["due_ts"])
+
+    now_ts = _time.time()
+    for planned_date_str in restored["open_days"]:
+        schedule_at(max(now_ts, last_due.get(planned_date_str, 0)), send_key, _job_day_done, planned_date_str)
+    job["days_pending"] = len(restored["open_days"])
+
+async def _job_plan(key, _payload):
+    """Keyingi postli arxiv kunini topadi, tayyorlaydi va postlarini taymerga qo‘yadi (look-ahead)."""
+    user_id = key[0]
+    job = _jobs.get(user_id)
+    if job is None:
+        return
+    try:
+        client = await get_client(user_id)
+        if job["day_iter"] is None:
+            job["day_iter"] = iter_archive_days(client, job["source_id"], *job["archive_range"]).__aiter__()
+        fetched = None
+        async for current_day, posts_to_send in job["day_iter"]:
             if not posts_to_send:
                 logger.info(f"User({user_id}) no posts found for {current_day}")
-                current_day += timedelta(days=1)
                 continue
+            staged, staged_bytes = await stage_day_posts(client, user_id, job["source_id"], posts_to_send)
+            logger.info(
+                f"User({user_id}) prefetched {current_day}: {len(posts_to_send)} posts, "
+                f"{staged} inline staged, {staged_bytes} media bytes cached"
+            )
+            fetched = (current_day, posts_to_send)
+            break
+    except Exception as e:
+        # Xato bilan to‘xtagan generator davom ettirilmaydi — qayta urinishda archive_range dan yangisi ochiladi
+        job["day_iter"] = None
+        await _job_error(job, key, _job_plan, e)
+        return
+    job["retry_attempt"] = 0
 
-            # --- HAR KUN BOSHI: POSTLAR RO‘YXATI YUBORILADI ---
-            user_offset = timezone(offset_delta)
-            planned_date_str = planned_date.strftime("%Y-%m-%d")
-            post_list_text = [
-                f"- ID: {post['msg'].id}  |  Время: {datetime.combine(planned_date, post['msg_time_utc'].time(), tzinfo=timezone.utc).astimezone(user_offset).strftime('%Y-%m-%d %H:%M')}"
-                for post in posts_to_send
-            ]
-            txt = f"Список постов ({planned_date_str}, UTC{utc_offset:+}):\n" + "\n".join(post_list_text)
-            if context and hasattr(context, "bot"):
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=txt
-                )
-
-            # --- HAR BIR POST YUBORILADI ---
-
-            for post in posts_to_send:
-                post_time = post["msg_time_utc"].time()
-                target_datetime = datetime.combine(planned_date, post_time, tzinfo=timezone.utc) + offset_delta
-                now_dt = datetime.now(timezone.utc) + offset_delta
-                sleep_seconds = (target_datetime - now_dt).total_seconds()
-                if sleep_seconds > 0:
-                    logger.info(f"User({user_id}) sleeping {int(sleep_seconds)}s for post {post['msg'].id} at {target_datetime}")
-                    await asyncio.sleep(sleep_seconds)
-
-                # Uyg'ongan zahoti Telethon clientni jonlantiramiz
-                try:
-                    from telethon_client.repost_utils import _ensure_connected
-                    await _ensure_connected(client)
-                except Exception:
-                    if not client.is_connected():
-                        await client.connect()
-                        try:
-                            await client.start()
-                        except Exception:
-                            pass
-
-                ok = await send_post_to_targets(client, target_ids, post, source_id)
-                if ok:
-                    logger.info(f"User({user_id}) post {post['msg'].id} sent to targets.")
-                    if context and hasattr(context, "bot"):
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text=f"Пост id {post['msg'].id} отправлено ✅"
-                        )
-                else:
-                    logger.warning(f"User({user_id}) post {post['msg'].id} FAILED to send.")
-                    if context and hasattr(context, "bot"):
-                        await context.bot.send_message(
-                            chat_id=user_id,
-                            text=f"⚠️ Пост id {post['msg'].id} не отправлен. Попробую дальше."
-                        )
-
-                await asyncio.sleep(2)
-
-            if context and hasattr(context, "bot"):
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=f"✅ {planned_date_str} все посты отправлены!"
-                )
+    if _jobs.get(user_id) is not job:
+        return  # planlash paytida bekor qilindi
+    if fetched is None:
+        job["exhausted"] = True
+        await job_store.update_job(user_id, exhausted=1)
+        await _maybe_finish_job(job)
+        return
 
-            current_day += timedelta(days=1)
-            idx += 1
+    current_day, posts_to_send = fetched
+    job["archive_range"] = (current_day + timedelta(days=1), job["archive_range"][1])
+    planned_date = job["start_repost_date"] + timedelta(days=job["idx"])
+    job["idx"] += 1
+    job["days_pending"] += 1
 
-        # Hammasi tugadi
-        if context and hasattr(context, "bot"):
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"🎉 Репосты за все дни завершены!"
-            )
+    now_ts = _time.time()
+    day_start_ts = datetime.combine(planned_date, time(0, 0), tzinfo=timezone.utc).timestamp()
+    send_key = _send_key(user_id)
+    due_times = [
+        datetime.combine(planned_date, _post_time(post), tzinfo=timezone.utc).timestamp()
+        for post in posts_to_send
+    ]
+
+    # Reja (kun + post idlar) diskka yoziladi — restartdan keyin shu yerdan davom etamiz
+    await job_store.save_planned_day(
+        user_id,
+        planned_date.isoformat(),
+        [
+            (post.id, due_ts, list(post.group_ids) if post.group_ids else None)
+            for post, due_ts in zip(posts_to_send, due_times)
+        ],
+        job["idx"],
+        (current_day + timedelta(days=1)).isoformat(),
+    )
 
-    except asyncio.CancelledError:
-        logger.warning(f"User({user_id}) repost bekor qilindi.")
-        if context and hasattr(context, "bot"):
-            await context.bot.send_message(chat_id=user_id, text="⏹️ Репост отменён.")
-        raise
+    # --- HAR KUN BOSHI: POSTLAR RO‘YXATI YUBORILADI ---
+    utc_offset = job["utc_offset"]
+    user_offset = timezone(timedelta(hours=utc_offset))
+    planned_date_str = planned_date.strftime("%Y-%m-%d")
+    post_list_text = [
+        f"- ID: {post.id}  |  Время: {datetime.fromtimestamp(due_ts, timezone.utc).astimezone(user_offset).strftime('%Y-%m-%d %H:%M')}"
+        for post, due_ts in zip(posts_to_send, due_times)
+    ]
+    txt = f"Список постов ({planned_date_str}, UTC{utc_offset:+}):\n" + "\n".join(post_list_text)
+    schedule_at(max(now_ts, day_start_ts), send_key, _job_announce, txt)
+
+    # --- HAR BIR POST O‘Z VAQTIGA QO‘YILADI ---
+    last_due = now_ts
+    for post, due_ts in zip(posts_to_send, due_times):
+        schedule_at(due_ts, send_key, _job_send, post)
+        last_due = max(last_due, due_ts)
+    schedule_at(last_due, send_key, _job_day_done, planned_date.isoformat())
+
+    # Bu kun boshlanganda keyingi kun fonda yuklanadi
+    schedule_at(max(now_ts, day_start_ts), _plan_key(user_id), _job_plan)
+
+async def _job_announce(key, txt):
+    job = _jobs.get(key[0])
+    if job is not None:
+        await _notify(job, txt)
+
+async def _job_send(key, post):
+    user_id = key[0]
+    job = _jobs.get(user_id)
+    if job is None:
+        return
+
+    client = await get_client(user_id)
+    msg_id = post.id
+
+    # Akkaunt FloodWait pauzasida — postni pauzadan keyinga qayta navbatga qo‘yamiz
+    pause = paused_for(client_account(client))
+    if pause > 0:
+        _requeue_post(job, key, post, pause)
+        return
+
+    try:
+        await _ensure_connected(client)
     except Exception as e:
-        logger.error(f"User({user_id}) repostda xatolik: {e}", exc_info=True)
-        if context and hasattr(context, "bot"):
-            await context.bot.send_message(chat_id=user_id, text="❌ Ошибка в репосте!")
-    finally:
-        await client.disconnect()
-        if context and hasattr(context, "bot"):
-            try:
-                await context.bot.send_message(chat_id=user_id, text="✅ Репост завершён!")
-            except Exception as e:
-                logger.error(f"User({user_id}) notify error: {e}", exc_info=True)
+        logger.warning(f"User({user_id}) reconnect before send failed: {e}")
+
+    # Ledger: shu postni allaqachon olgan targetlarga qayta yubormaymiz
+    sent_targets = await job_store.get_sent_targets(user_id, msg_id)
+    pending = [(link, tid) for link, tid in zip(job["targets"], job["target_ids"]) if link not in sent_targets]
+    if not pending:
+        await job_store.mark_sent(user_id, msg_id, [])
+        await _release_post(user_id, post)
+        await _post_finished(job, post)
+        return
+
+    # Inline post qoldiqlari (store yozuvi, .part fayllar) post tugagunicha saqlanadi — qayta urinish davom etadi
+    results = await send_post_to_targets(
+        client, [tid for _, tid in pending], post, job["source_id"], user_id, cleanup=False
+    )
+    sent = [link for link, tid in pending if results.get(tid)]
+    failed = [link for link, tid in pending if not results.get(tid)]
+
+    # FloodWait: akkaunt pauzada — muvaffaqiyatsiz targetlar pauzadan keyin qayta navbatga qo‘yiladi
+    pause = paused_for(client_account(client))
+    if failed and pause > 0:
+        await job_store.mark_sent(user_id, msg_id, sent, done=False)
+        _requeue_post(job, key, post, pause)
+        return
+
+    await job_store.mark_sent(user_id, msg_id, sent)
+    if not failed:
+        logger.info(f"User({user_id}) post {msg_id} sent to targets.")
+        await _notify(job, f"Пост id {msg_id} отправлено ✅")
+    elif sent:
+        logger.warning(f"User({user_id}) post {msg_id} partially sent, failed targets: {failed}")
+        await _notify(job, f"⚠️ Пост id {msg_id} не отправлен в: {', '.join(failed)}. Попробую дальше.")
+    else:
+        logger.warning(f"User({user_id}) post {msg_id} FAILED to send.")
+        await _notify(job, f"⚠️ Пост id {msg_id} не отправлен. Попробую дальше.")
+
+    await _release_post(user_id, post)
+    await _post_finished(job, post)
+
+async def _release_post(user_id, post):
+    """Post tugadi (qayta navbatga qo‘yilmaydi): inline store yozuvi va qisman yuklangan media o‘chiriladi."""
+    if post.kind in (None, KIND_INLINE):
+        await release_inline_post(user_id, post.id)
+
+def _requeue_post(job, key, post, delay):
+    if not post.requeued:
+        post.requeued = True
+        job["retries_pending"] = job.get("retries_pending", 0) + 1
+    schedule_at(_time.time() + delay, key, _job_send, post)
+    logger.warning(f"User({job['user_id']}) post {post.id} re-queued in {int(delay)}s (FloodWait)")
+
+async def _post_finished(job, post):
+    if post.requeued:
+        post.requeued = False
+        job["retries_pending"] -= 1
+        await _maybe_finish_job(job)
+
+async def _job_day_done(key, planned_date_str):
+    job = _jobs.get(key[0])
+    if job is None:
+        return
+    await _notify(job, f"✅ {planned_date_str} все посты отправлены!")
+    await job_store.mark_day_done(job["user_id"], planned_date_str)
+    job["days_pending"] -= 1
+    await _maybe_finish_job(job)
+
+async def _maybe_finish_job(job):
+    """Arxiv tugagan, barcha kunlar va qayta navbatdagi postlar yuborilgan bo‘lsa ishni yakunlaydi."""
+    if job["exhausted"] and job["days_pending"] == 0 and job.get("retries_pending", 0) == 0:
+        await _finish_job(job)
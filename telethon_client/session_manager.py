@@ -1,59 +1,114 @@
 import os
-import json
+import time
+import random
+import asyncio
 from asyncio import Lock
 from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError
-from config import API_ID, API_HASH, SESSION_FOLDER
+from telethon.tl.functions import PingRequest
+from config import API_ID, API_HASH, SESSION_FOLDER, CLIENT_IDLE_TIMEOUT, CLIENT_HEALTH_CHECK_INTERVAL, SESSION_FLUSH_INTERVAL
 from bot.logger import logger
-from telethon_client.user_map import get_phone_by_user as map_get_phone_by_user
+from telethon_client.user_map import get_phone_by_user as map_get_phone_by_user, link_user_to_phone, unlink_phone
+from telethon_client.storage import run_io, run_db
+from telethon_client.memory_session import PersistentMemorySession, write_snapshot
+from telethon_client.account_scheduler import run_on_account, PRIORITY_INTERACTIVE
+from telethon_client.channel_store import remove_user
 
-# Universal user-based lock manager
-_user_session_locks: dict[str, Lock] = {}
+# Telefon raqam bo‘yicha doimiy TelegramClient havzasi
+_clients: dict[str, TelegramClient] = {}
+_client_last_used: dict[str, float] = {}
+_pool_locks: dict[str, Lock] = {}
+_health_task: asyncio.Task | None = None
 
-async def with_session_lock(phone: str, func, *args, **kwargs):
-    """Har bir telefon raqam uchun yagona lock, har qanday TelethonClient handlerni safe tarzda ishlatadi."""
-    if phone not in _user_session_locks:
-        _user_session_locks[phone] = Lock()
-    async with _user_session_locks[phone]:
-        return await func(*args, **kwargs)
+# Telefon raqam bo‘yicha xotiradagi sessiyalar — .session faylning yagona egasi (login va pooled client ham shu obyektni ishlatadi)
+_sessions: dict[str, PersistentMemorySession] = {}
+_session_locks: dict[str, Lock] = {}
+_flush_task: asyncio.Task | None = None
 
 def get_session_file_path(phone: str) -> str:
     return os.path.join(SESSION_FOLDER, f"{phone}")
 
-def session_exists(phone: str) -> bool:
+def remove_session_file(phone: str) -> bool:
+    """.session faylni o‘chiradi (bloklovchi — delete_session orqali chaqiring)."""
+    session_file = f"{get_session_file_path(phone)}.session"
+    if os.path.exists(session_file):
+        os.remove(session_file)
+        return True
+    return False
+
+async def session_exists(phone: str) -> bool:
     session_path = get_session_file_path(phone)
-    exists = os.path.exists(f"{session_path}.session")
+    exists = await run_io(os.path.exists, f"{session_path}.session")
     logger.info(f"session_exists({phone}): {exists}")
     return exists
 
-def save_user_session(user_id: int, phone: str):
-    path = os.path.join(SESSION_FOLDER, "session_store.json")
+async def _get_session(phone: str, create: bool = False) -> PersistentMemorySession:
+    """Xotiradagi sessiyani beradi; birinchi marta .session fayldan yuklanadi. create=True — fayl bo‘lmasa yangisi."""
+    if phone not in _session_locks:
+        _session_locks[phone] = Lock()
+    async with _session_locks[phone]:
+        session = _sessions.get(phone)
+        if session is None:
+            session_name = get_session_file_path(phone)
+            if await run_io(os.path.exists, f"{session_name}.session"):
+                session = await run_db(PersistentMemorySession.load, session_name)
+                logger.info(f"session loaded into memory for {phone}")
+            elif create:
+                session = PersistentMemorySession()
+            else:
+                logger.error(f"acquire_client: Session file not found: {session_name}")
+                raise FileNotFoundError(f"❌ Session file topilmadi: {session_name}")
+            _sessions[phone] = session
+        return session
+
+def _write_session(phone: str, session: PersistentMemorySession, snapshot: dict):
+    # DB threadida: shu orada delete_session chaqirilgan bo‘lsa, o‘chirilgan faylni qayta yaratmaymiz
+    if _sessions.get(phone) is not session:
+        return
+    write_snapshot(get_session_file_path(phone), snapshot)
+
+async def flush_session(phone: str, force: bool = False):
+    """Sessiya o‘zgargan bo‘lsa (yoki force) .session fayliga yozadi."""
+    session = _sessions.get(phone)
+    if session is None or not (session.dirty or force):
+        return
     try:
-        if os.path.exists(path):
-            with open(path, "r") as f:
-                data = json.load(f)
-        else:
-            data = {}
-        data[str(user_id)] = phone
-        with open(path, "w") as f:
-            json.dump(data, f, indent=2)
-        logger.info(f"User({user_id}) session mapping saved: {phone}")
+        await run_db(_write_session, phone, session, session.snapshot())
     except Exception as e:
-        logger.error(f"save_user_session error: {e}", exc_info=True)
+        session.dirty = True  # keyingi flush da qayta urinadi
+        logger.error(f"flush_session error ({phone}): {e}", exc_info=True)
+
+async def flush_sessions():
+    for phone in list(_sessions):
+        await flush_session(phone)
+
+async def delete_session(phone: str) -> bool:
+    """Xotiradagi sessiyani unutadi va .session faylni o‘chiradi."""
+    _sessions.pop(phone, None)
+    _evict_lock(_session_locks, phone)
+    return await run_db(remove_session_file, phone)
+
+async def save_user_session(user_id: int, phone: str):
+    # user_map yagona manba (session_store.json unga birlashtirilgan)
+    await link_user_to_phone(user_id, phone)
+    logger.info(f"User({user_id}) session mapping saved: {phone}")
 
 def get_phone_by_user(user_id: int) -> str | None:
-    logger.info(f"[session_manager] get_phone_by_user called for user_id={user_id}")
-    phone = map_get_phone_by_user(user_id)  # user_map ichida ham tekshiruv+log bor
-    logger.info(f"[session_manager] get_phone_by_user result: {phone}")
-    return phone
+    return map_get_phone_by_user(user_id)  # xotiradagi indeks, fayl har safar o‘qilmaydi
+
+def _new_client(session) -> TelegramClient:
+    # flood_sleep_threshold=0: Telethon FloodWait ni o‘zi jim kutmaydi (default 60s gacha) — har bir FloodWait
+    # rate_limiter.limited_call ga yetib boradi: faqat shu akkaunt pauzaga qo‘yiladi, slot/tokenlar band qolmaydi
+    return TelegramClient(session, API_ID, API_HASH, flood_sleep_threshold=0)
 
-# === TELETHON ASOSHIY HANDLERLARINI UNIVERSAL LOCK ICHIDA QILING! ===
+# === LOGIN/LOGOUT AKKAUNT SCHEDULERIDA EXCLUSIVE BAJARILADI (boshqa so‘rovlar tugashini kutadi) ===
 
 async def start_login(phone: str) -> tuple[TelegramClient, str]:
-    """Raqam kirgandan keyin: kod yuboriladi. Lock bilan faqat bitta client ishlaydi."""
-    session_name = get_session_file_path(phone)
+    """Raqam kirgandan keyin: kod yuboriladi. Exclusive slotda — shu paytda akkauntda boshqa so‘rov ishlamaydi."""
     async def do_login():
-        client = TelegramClient(session_name, API_ID, API_HASH)
+        # Qayta login: eski pooled client yopiladi — exclusive slot ichida, in-flight so‘rovlar tugagandan keyin
+        await drop_client(phone)
+        client = _new_client(await _get_session(phone, create=True))
         await client.connect()
         logger.info(f"[DEBUG] Trying to send_code_request to: {phone}")
         sent_code = await client.send_code_request(phone)
@@ -61,7 +116,7 @@ async def start_login(phone: str) -> tuple[TelegramClient, str]:
         phone_code_hash = sent_code.phone_code_hash
         logger.info(f"start_login: code sent to {phone}")
         return client, phone_code_hash
-    return await with_session_lock(phone, do_login)
+    return await run_on_account(phone, do_login, exclusive=True, priority=PRIORITY_INTERACTIVE)
 
 async def complete_login(client: TelegramClient, phone: str, code: str, phone_code_hash: str, password: str = None):
     try:
@@ -80,47 +135,158 @@ async def complete_login(client: TelegramClient, phone: str, code: str, phone_co
         await client.disconnect()   # faqat haqiqiy xatoda disconnect qilamiz
         raise
     else:
+        await flush_session(phone, force=True)  # auth key darhol diskka — session_exists shunga qaraydi
         await client.disconnect()   # successda disconnect qilamiz
 
+async def acquire_client(phone: str) -> TelegramClient:
+    """Havzadan phone uchun ulangan clientni beradi. Yo‘q bo‘lsa yaratadi, uzilgan bo‘lsa lazy qayta ulaydi."""
+    if phone not in _pool_locks:
+        _pool_locks[phone] = Lock()
+    async with _pool_locks[phone]:
+        client = _clients.get(phone)
+        if client is None:
+            client = _new_client(await _get_session(phone))
+            _clients[phone] = client
+            logger.info(f"acquire_client: new pooled client for {phone}")
+        if not client.is_connected():
+            await client.connect()
+            logger.info(f"acquire_client: connected pooled client for {phone}")
+        _client_last_used[phone] = time.monotonic()
+        return client
+
+def touch_client(client: TelegramClient):
+    """Client ishlatilganini belgilaydi (idle-timeout hisoblash uchun)."""
+    for phone, pooled in _clients.items():
+        if pooled is client:
+            _client_last_used[phone] = time.monotonic()
+            return
+
+def get_client_phone(client: TelegramClient) -> str | None:
+    """Pooled client qaysi telefon raqamga tegishli ekanini qaytaradi."""
+    for phone, pooled in _clients.items():
+        if pooled is client:
+            return phone
+    return None
+
+def _evict_lock(locks: dict[str, Lock], phone: str):
+    # Telefon bo‘yicha lock lug‘atlari faqat ishlatilayotgan akkauntlar bilan o‘sadi; band lock qoldiriladi
+    lock = locks.get(phone)
+    if lock is not None and not lock.locked():
+        del locks[phone]
+
+async def drop_client(phone: str):
+    """Havzadagi clientni yopadi va olib tashlaydi (logout / qayta login uchun)."""
+    client = _clients.pop(phone, None)
+    _client_last_used.pop(phone, None)
+    _evict_lock(_pool_locks, phone)
+    if client is None:
+        return
+    try:
+        if client.is_connected():
+            await client.disconnect()
+        logger.info(f"drop_client: pooled client closed for {phone}")
+    except Exception as e:
+        logger.error(f"drop_client error ({phone}): {e}", exc_info=True)
+
+async def close_all_clients():
+    """Bot to‘xtaganda barcha clientlarni yopadi va sessiyalarni diskka yozadi."""
+    stop_client_health_check()
+    stop_session_flush()
+    for phone in list(_clients):
+        await drop_client(phone)
+    await flush_sessions()
+
+async def _check_client(phone: str, client: TelegramClient):
+    idle = time.monotonic() - _client_last_used.get(phone, 0)
+    if idle > CLIENT_IDLE_TIMEOUT:
+        await client.disconnect()
+        logger.info(f"health_check: idle client disconnected for {phone} ({int(idle)}s)")
+        return
+    try:
+        await asyncio.wait_for(client(PingRequest(ping_id=random.getrandbits(63))), timeout=10)
+    except Exception as e:
+        # Buzilgan ulanishni uzamiz — keyingi acquire_client qayta ulaydi
+        logger.warning(f"health_check: ping failed for {phone}: {e}")
+        await client.disconnect()
+
+async def _health_check_loop():
+    while True:
+        await asyncio.sleep(CLIENT_HEALTH_CHECK_INTERVAL)
+        for phone, client in list(_clients.items()):
+            if not client.is_connected():
+                continue
+            try:
+                await _check_client(phone, client)
+            except Exception as e:
+                logger.error(f"health_check error ({phone}): {e}", exc_info=True)
+
+def start_client_health_check():
+    global _health_task
+    if _health_task is None or _health_task.done():
+        _health_task = asyncio.create_task(_health_check_loop())
+        logger.info("Client pool health check started")
+
+def stop_client_health_check():
+    global _health_task
+    if _health_task and not _health_task.done():
+        _health_task.cancel()
+    _health_task = None
+
+async def _session_flush_loop():
+    while True:
+        await asyncio.sleep(SESSION_FLUSH_INTERVAL)
+        try:
+            await flush_sessions()
+        except Exception as e:
+            logger.error(f"session flush error: {e}", exc_info=True)
+
+def start_session_flush():
+    global _flush_task
+    if _flush_task is None or _flush_task.done():
+        _flush_task = asyncio.create_task(_session_flush_loop())
+        logger.info("Session flush started")
+
+def stop_session_flush():
+    global _flush_task
+    if _flush_task and not _flush_task.done():
+        _flush_task.cancel()
+    _flush_task = None
+
 async def get_client(user_id: int) -> TelegramClient:
-    """Istalgan vaqtda userning to‘liq connect bo‘lgan TelegramClient obyektini beradi. Doim lock ichida!"""
+    """Istalgan vaqtda userning to‘liq connect bo‘lgan TelegramClient obyektini beradi (havzadan, yopmang!)."""
     phone = get_phone_by_user(user_id)
     if not phone:
         logger.error(f"get_client: No phone for user_id {user_id}")
         raise Exception("📛 Telefon raqam topilmadi (session bog‘lamasi yo‘q)")
 
-    session_name = get_session_file_path(phone)
-    if not os.path.exists(f"{session_name}.session"):
-        logger.error(f"get_client: Session file not found: {session_name}")
-        raise FileNotFoundError(f"❌ Session file topilmadi: {session_name}")
+    client = await acquire_client(phone)
+    logger.info(f"get_client: pooled client ready for user_id {user_id}")
+    return client
 
-    async def _connect():
-        client = TelegramClient(session_name, API_ID, API_HASH)
-        await client.connect()
-        logger.info(f"get_client: connected for user_id {user_id}")
-        return client
-    return await with_session_lock(phone, _connect)
+async def logout(phone: str, user_ids=()):
+    """
+    Foydalanuvchini Telegramdan logout qilish va sessionni tozalash. Hammasi (client, sessiya, user_map,
+    entity keshi, userlarning kanal ma’lumotlari) exclusive slotda — ishlayotgan send/yuklashlar tugagach.
+    Repost ishlarini chaqiruvchi oldinroq bekor qiladi (cancel_repost_job).
+    """
+    # entity_cache → rate_limiter → session_manager: modul darajasida import aylanma bo‘lardi
+    from telethon_client import entity_cache
 
-async def logout(phone: str):
-    """Foydalanuvchini Telegramdan logout qilish va sessionni tozalash."""
-    session_name = get_session_file_path(phone)
     async def _logout():
-        client = TelegramClient(session_name, API_ID, API_HASH)
-        await client.connect()
-        await client.log_out()
-        await client.disconnect()
+        if await session_exists(phone):
+            try:
+                client = await acquire_client(phone)
+                await client.log_out()
+            except Exception as e:
+                logger.warning(f"logout: Telegram log_out failed for {phone}: {e}")
+        await drop_client(phone)
         logger.info(f"logout: logged out and disconnected for {phone}")
 
-        if os.path.exists(f"{session_name}.session"):
-            os.remove(f"{session_name}.session")
+        if await delete_session(phone):
             logger.info(f"logout: session file removed for {phone}")
 
-        path = os.path.join(SESSION_FOLDER, "session_store.json")
-        if os.path.exists(path):
-            with open(path, "r") as f:
-                data = json.load(f)
-            data = {k: v for k, v in data.items() if v != phone}
-            with open(path, "w") as f:
-                json.dump(data, f, indent=2)
-            logger.info(f"logout: user removed from session_store.json ({phone})")
-    await with_session_lock(phone, _logout)
+        await entity_cache.forget_account(phone)
+        await unlink_phone(phone)
+        for user_id in user_ids:
+            await remove_user(user_id)
+    await run_on_account(phone, _logout, exclusive=True, priority=PRIORITY_INTERACTIVE)
@@ -0,0 +1,70 @@
+# telethon_client/storage.py
+
+import os
+import asyncio
+import functools
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from config import SESSION_FOLDER, IO_WORKERS
+from bot.logger import logger
+
+_connections: dict[str, sqlite3.Connection] = {}
+
+# Fayl I/O uchun cheklangan thread pool; SQLite uchun alohida bitta thread (yozuvlar ketma-ket, tranzaksiyalar aralashmaydi)
+_io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="storage-io")
+_db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage-db")
+
+async def run_io(func, *args, **kwargs):
+    """Bloklovchi fayl operatsiyasini event loopdan tashqarida (thread poolda) bajaradi."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(func, *args, **kwargs))
+
+async def run_db(func, *args, **kwargs):
+    """SQLite bilan ishlovchi funksiyani yagona DB threadida bajaradi."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+def in_db_thread(func):
+    """Sinxron store funksiyasini DB threadida ishlaydigan awaitable funksiyaga aylantiradi."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    wrapper.sync = func
+    return wrapper
+
+def shutdown_storage():
+    _io_executor.shutdown(wait=True)
+    _db_executor.shutdown(wait=True)
+    for conn in _connections.values():
+        conn.close()
+    _connections.clear()
+
+def open_db(filename: str, schema: str) -> sqlite3.Connection:
+    """
+    SESSION_FOLDER ichidagi SQLite bazani (WAL rejimida) ochadi va schema ni qo‘llaydi.
+    Bir fayl uchun bitta ulanish qayta ishlatiladi.
+    """
+    if filename in _connections:
+        return _connections[filename]
+    os.makedirs(SESSION_FOLDER, exist_ok=True)
+    path = os.path.join(SESSION_FOLDER, filename)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(schema)
+    _connections[filename] = conn
+    logger.info(f"SQLite store opened: {path}")
+    return conn
+
+@contextmanager
+def transaction(conn: sqlite3.Connection):
+    """`with transaction(conn):` — BEGIN/COMMIT, xatoda ROLLBACK."""
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
@@ -2,40 +2,131 @@
 
 import json
 import os
+import tempfile
+import threading
 from bot.logger import logger
 from config import SESSION_FOLDER
+from telethon_client.storage import run_io, in_db_thread
 
 MAP_FILE = os.path.join(SESSION_FOLDER, "user_map.json")
+SESSION_STORE_FILE = os.path.join(SESSION_FOLDER, "session_store.json")  # eski parallel mapping, faqat merge uchun
 
-def load_user_map():
-    if not os.path.exists(MAP_FILE):
-        logger.warning(f"user_map.json not found: {MAP_FILE}")
-        return {}
+# Xotiradagi indeks: user_id (str) -> phone. Fayl mtime o‘zgarsa yoki yozilganda yangilanadi
+_index: dict[str, str] | None = None
+_index_mtime: float | None = None
+# Faylni qayta o‘qish va load-modify-save indeks bilan birga shu lock ostida (DB thread va event loop orasida)
+_lock = threading.RLock()
+
+def _file_mtime() -> float | None:
     try:
-        with open(MAP_FILE, "r") as f:
-            data = json.load(f)
-        logger.info(f"user_map loaded: {len(data)} users")
-        return data
-    except Exception as e:
-        logger.error(f"load_user_map error: {e}", exc_info=True)
-        return {}
+        return os.path.getmtime(MAP_FILE)
+    except OSError:
+        return None
 
-def save_user_map(data):
+def _merge_session_store(data: dict) -> bool:
+    """session_store.json dagi yozuvlarni user_map ga qo‘shadi (user_map ustun). Fayl .merged deb qayta nomlanadi."""
+    if not os.path.exists(SESSION_STORE_FILE):
+        return False
     try:
-        with open(MAP_FILE, "w") as f:
-            json.dump(data, f)
-        logger.info(f"user_map saved: {len(data)} users")
+        with open(SESSION_STORE_FILE, "r") as f:
+            legacy = json.load(f)
+        for user_id, phone in legacy.items():
+            data.setdefault(str(user_id), phone)
+        os.replace(SESSION_STORE_FILE, SESSION_STORE_FILE + ".merged")
+        logger.info(f"session_store.json merged into user_map: {len(legacy)} entries")
+        return True
     except Exception as e:
-        logger.error(f"save_user_map error: {e}", exc_info=True)
+        logger.error(f"session_store.json merge error: {e}", exc_info=True)
+        return False
+
+def load_user_map():
+    mtime = _file_mtime()
+    if _index is not None and mtime == _index_mtime:
+        return _index
+    with _lock:
+        return _reload_user_map()
+
+def _reload_user_map():
+    global _index, _index_mtime
+    mtime = _file_mtime()
+    if _index is not None and mtime == _index_mtime:
+        return _index  # lock kutilayotganda boshqa thread yangilab bo‘lgan
+
+    data = {}
+    if mtime is None:
+        logger.warning(f"user_map.json not found: {MAP_FILE}")
+    else:
+        try:
+            with open(MAP_FILE, "r") as f:
+                data = json.load(f)
+            logger.info(f"user_map loaded: {len(data)} users")
+        except Exception as e:
+            logger.error(f"load_user_map error: {e}", exc_info=True)
+            data = {}
+
+    _index = data
+    _index_mtime = mtime
+    if _merge_session_store(data):
+        save_user_map(data)
+    return _index
+
+def save_user_map(data):
+    global _index, _index_mtime
+    with _lock:
+        tmp_path = None
+        try:
+            os.makedirs(SESSION_FOLDER, exist_ok=True)
+            # Har yozuv o‘z vaqtinchalik faylida — parallel yozuvlar bir-birining .tmp ini o‘chirmaydi
+            fd, tmp_path = tempfile.mkstemp(dir=SESSION_FOLDER, prefix="user_map.", suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, MAP_FILE)
+            tmp_path = None
+            _index = data
+            _index_mtime = _file_mtime()
+            logger.info(f"user_map saved: {len(data)} users")
+        except Exception as e:
+            logger.error(f"save_user_map error: {e}", exc_info=True)
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+@in_db_thread
+def _link(user_id: int, phone: str):
+    with _lock:
+        data = dict(load_user_map())
+        data[str(user_id)] = phone
+        save_user_map(data)
 
-def link_user_to_phone(user_id: int, phone: str):
-    data = load_user_map()
-    data[str(user_id)] = phone
-    save_user_map(data)
+@in_db_thread
+def _unlink(phone: str) -> bool:
+    with _lock:
+        data = load_user_map()
+        remaining = {k: v for k, v in data.items() if v != phone}
+        if len(remaining) == len(data):
+            return False
+        save_user_map(remaining)
+        return True
+
+async def preload_user_map():
+    """Startupda faylni I/O threadida o‘qiydi — handlerlar xotiradagi indeksdan foydalanadi."""
+    await run_io(load_user_map)
+
+async def link_user_to_phone(user_id: int, phone: str):
+    # load-modify-save yagona DB threadida ketma-ket — parallel bog‘lashlar bir-birini yo‘qotmaydi
+    await _link(user_id, phone)
     logger.info(f"User({user_id}) linked to phone: {phone}")
 
+async def unlink_phone(phone: str):
+    """Shu telefon raqamga bog‘langan barcha userlarni olib tashlaydi (logout)."""
+    if await _unlink(phone):
+        logger.info(f"user_map: phone {phone} unlinked")
+
+def get_users_by_phone(phone: str) -> list[int]:
+    """Shu telefon raqamga bog‘langan barcha userlar (logout paytida ularning ishlari ham to‘xtatiladi)."""
+    return [int(user_id) for user_id, linked in load_user_map().items() if linked == phone]
+
 def get_phone_by_user(user_id: int) -> str | None:
-    data = load_user_map()
-    phone = data.get(str(user_id))
-    logger.info(f"get_phone_by_user({user_id}): {phone}")
+    phone = load_user_map().get(str(user_id))
+    logger.debug(f"get_phone_by_user({user_id}): {phone}")
     return phone